@@ -1,21 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from sqlalchemy import select, func
 from api.database import get_db, Appointment, AppointmentReason, AppointmentStatus
 from .schemas.user import AppointmentCreate, AppointmentResponse, AppointmentStatusResponse, AppointmentReasonResponse
 from sqlalchemy.orm import joinedload, Session
+from .fields import sparse_fields, sparse_response
+from .inserts import insert_returning, integrity_errors
+from .json_filters import json_filters, like_prefix, search_rows
 
 
 router = APIRouter()
 
 @router.get("/", response_model=List[AppointmentResponse])
 async def get_appointments(
+    columns: Optional[List] = Depends(sparse_fields(AppointmentResponse, Appointment)),
     db: Session = Depends(get_db),
 ):
     """
     Obtiene todas las citas en la base de datos.
+    Con `?fields=` solo se consultan las columnas pedidas, sin cargar las relaciones.
     """
+    if columns:
+        return sparse_response(db.execute(select(*columns)).all())
+
     appointments = db.execute(
         select(Appointment)
         .options(
@@ -33,13 +41,45 @@ async def create_appointment(
     """
     Crea una nueva cita en la base de datos.
     """
-    # Simplemente desempaca todos los datos del esquema en el modelo.
-    # Pydantic y SQLAlchemy se encargarán de mapear los campos correctos.
-    new_appointment = Appointment(**appointment_data.model_dump())
-    db.add(new_appointment)
-    db.commit()
-    db.refresh(new_appointment)
-    return new_appointment
+    # Simplemente desempaca todos los datos del esquema en un INSERT ... RETURNING.
+    # Las claves foráneas rechazan referencias inexistentes (404).
+    with integrity_errors(db):
+        new_appointment = insert_returning(db, Appointment, appointment_data.model_dump())
+        # Se serializa antes del commit, que expira la instancia y obligaría a releerla
+        response = AppointmentResponse.model_validate(new_appointment)
+        db.commit()
+    return response
+
+@router.get("/search", response_model=List[AppointmentResponse])
+async def search_appointments(
+    contains: Optional[str] = None,
+    path: Optional[str] = None,
+    vin_prefix: Optional[str] = Query(None, min_length=1),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Busca citas por los datos temporales del vehículo (`temp_vehicle_data`).
+    - `contains`: objeto JSON contenido (`@>`), p. ej. `{"make": "Nissan"}`.
+    - `path`: expresión JSONPath (`@?`).
+    - `vin_prefix`: VIN que empieza con el texto dado.
+    `contains` y `path` usan el índice GIN `jsonb_path_ops`; el prefijo del VIN, el índice
+    `text_pattern_ops` sobre `temp_vehicle_data ->> 'vin'` (un GIN no resuelve prefijos).
+    """
+    clauses = json_filters(Appointment.temp_vehicle_data, contains, path)
+    if vin_prefix is not None:
+        clauses.append(Appointment.temp_vehicle_data["vin"].astext.like(like_prefix(vin_prefix), escape="/"))
+    if not clauses:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide contains, path or vin_prefix")
+
+    stmt = (
+        select(Appointment)
+        .options(joinedload(Appointment.status), joinedload(Appointment.reason))
+        .where(*clauses)
+        .order_by(Appointment.appointment_date.desc())
+        .limit(limit)
+    )
+    return search_rows(db, stmt)
 
 @router.get("/reasons/", response_model=List[AppointmentReasonResponse])
 async def get_appointment_reasons(
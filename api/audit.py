@@ -0,0 +1,224 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import List, Optional
+
+from sqlalchemy import event, insert, inspect
+
+from .database import AuditLog, BodyworkDetails, Order, OrderInventoryData, get_engine
+from .metrics import AUDIT_EVENTS
+from .slow_queries import current_scope
+from .tokens import decode_access_token
+
+# --- Configuración (variables de entorno) ---
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))  # Eventos en memoria; si se llena se descartan
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))  # Segundos máximos de espera por lote
+
+logger = logging.getLogger("autoerp.audit")
+
+# Modelos auditados: cambios de la orden y de lo que cuelga de ella
+AUDITED_MODELS = (Order, BodyworkDetails, OrderInventoryData)
+
+_STOP = object()
+_queue: "queue.Queue" = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+_writer_thread: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _current_user_id() -> Optional[int]:
+    """
+    Usuario del token `Authorization: Bearer ...` de la petición en curso.
+    Solo se verifica la firma; no se consulta la BD.
+    """
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    for key, value in scope.get("headers", []):
+        if key == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                claims = decode_access_token(token)
+                return claims["sub"] if claims else None
+    return None
+
+
+def _snapshot(obj, action: str) -> Optional[dict]:
+    """
+    Describe el cambio de `obj` en este flush, o None si no cambió nada.
+    """
+    state = inspect(obj)
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        if action == "update":
+            history = state.attrs[attr.key].history
+            if history.has_changes():
+                old = history.deleted[0] if history.deleted else None
+                new = history.added[0] if history.added else None
+                changes[attr.key] = [_jsonable(old), _jsonable(new)]
+        elif attr.key in state.dict:
+            # Solo lo ya cargado: leer un atributo expirado de una fila borrada lanzaría una consulta
+            changes[attr.key] = _jsonable(state.dict[attr.key])
+    if not changes:
+        return None
+    return {
+        "table_name": state.mapper.local_table.name,
+        # La identidad de un objeto nuevo se asigna después de after_flush; el ID ya está en sus atributos
+        "row_id": state.dict.get(state.mapper.get_property_by_column(state.mapper.primary_key[0]).key),
+        "order_id": state.dict.get("order_id"),
+        "action": action,
+        "changes": changes,
+    }
+
+
+def record_change(session, table_name: str, row_id: int, action: str, changes: dict,
+                  order_id: Optional[int] = None) -> None:
+    """
+    Registra un cambio hecho sin el ORM (p. ej. un UPDATE directo); se escribe si la transacción confirma.
+    """
+    session.info.setdefault("audit_pending", []).append({
+        "table_name": table_name, "row_id": row_id, "order_id": order_id,
+        "action": action, "changes": {key: _jsonable(value) for key, value in changes.items()},
+        "user_id": _current_user_id(),
+    })
+
+
+def record_insert(session, obj) -> None:
+    """
+    Registra la creación de `obj` hecha con `INSERT ... RETURNING`, que no pasa por el flush del ORM.
+    """
+    record = _snapshot(obj, "insert")
+    if record is not None:
+        record["user_id"] = _current_user_id()
+        session.info.setdefault("audit_pending", []).append(record)
+
+
+# --- Listeners de la sesión ---
+
+def _after_flush(session, flush_context) -> None:
+    # En after_flush los objetos nuevos ya tienen ID y el historial de atributos sigue disponible
+    pending = session.info.setdefault("audit_pending", [])
+    user_id = _current_user_id()
+    for action, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            if isinstance(obj, AUDITED_MODELS):
+                record = _snapshot(obj, action)
+                if record is not None:
+                    record["user_id"] = user_id
+                    pending.append(record)
+
+
+def _after_commit(session) -> None:
+    pending = session.info.pop("audit_pending", None)
+    if pending:
+        changed_at = datetime.now(timezone.utc)
+        for record in pending:
+            record["changed_at"] = changed_at
+            enqueue(record)
+
+
+def _after_rollback(session) -> None:
+    # Lo revertido no ocurrió: se descarta
+    session.info.pop("audit_pending", None)
+
+
+def install_audit_log(session_factory) -> None:
+    """
+    Registra en `session_factory` (SessionLocal) los listeners que capturan los cambios auditados.
+    """
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_rollback", _after_rollback)
+
+
+# --- Escritura en segundo plano ---
+
+def enqueue(record: dict) -> None:
+    """
+    Encola un evento sin bloquear la petición. Si la cola está llena el evento se descarta
+    (y se cuenta): la memoria queda acotada aunque la BD no dé abasto.
+    """
+    _ensure_writer()
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        AUDIT_EVENTS.inc("dropped")
+        logger.warning(f"Cola de auditoría llena: se descartó un evento de {record['table_name']} {record['row_id']}")
+
+
+def _ensure_writer() -> None:
+    global _writer_thread
+    if _writer_thread is None:
+        with _writer_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer, name="audit-writer", daemon=True)
+                _writer_thread.start()
+                atexit.register(shutdown_audit_writer)
+
+
+def _write_batch(records: List[dict]) -> None:
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(insert(AuditLog), records)
+        AUDIT_EVENTS.inc("written", amount=len(records))
+    except Exception as e:  # La auditoría nunca debe tumbar el hilo
+        AUDIT_EVENTS.inc("failed", amount=len(records))
+        logger.error(f"No se pudo escribir un lote de {len(records)} eventos de auditoría: {e}")
+
+
+def _writer() -> None:
+    """
+    Toma eventos de la cola y los inserta en lotes de hasta AUDIT_BATCH_SIZE,
+    esperando como mucho AUDIT_FLUSH_INTERVAL a que se complete cada lote.
+    """
+    while True:
+        item = _queue.get()
+        stop = item is _STOP
+        batch = [] if stop else [item]
+        deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+        while not stop and len(batch) < AUDIT_BATCH_SIZE:
+            try:
+                item = _queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+            else:
+                batch.append(item)
+        if batch:
+            _write_batch(batch)
+        if stop:
+            return
+
+
+def shutdown_audit_writer(timeout: float = 10.0) -> None:
+    """
+    Escribe lo que quede en la cola y detiene el hilo. Se llama al apagar la app (y en atexit).
+    """
+    global _writer_thread
+    with _writer_lock:
+        thread, _writer_thread = _writer_thread, None
+    if thread is None or not thread.is_alive():
+        return
+    # La marca de parada va detrás de los eventos pendientes, así que todos se escriben antes
+    try:
+        _queue.put(_STOP, timeout=timeout)
+    except queue.Full:
+        logger.error("No se pudo vaciar la cola de auditoría al apagar")
+        return
+    thread.join(timeout)
@@ -7,9 +7,11 @@ from sqlalchemy import select, func
 
 # Importa las clases y la sesión desde el nuevo archivo database.py
 from .database import User, Permission, get_db
+from .sessions import CurrentSession, build_permission_list, get_current_session, permission_cache
+from .tokens import create_access_token
 
-# Configuración básica de logging
-logging.basicConfig(level=logging.INFO)
+# Logger del módulo; la configuración del logging la hace quien arranca la app, no el import
+logger = logging.getLogger("autoerp.auth")
 
 # Crea una instancia de APIRouter
 router = APIRouter()
@@ -28,9 +30,9 @@ class UserLogin(BaseModel):
 class LoginResponse(BaseModel):
     message: str
     permissions: List[str]
-    # En un sistema real, aquí devolverías un token de acceso:
-    # access_token: str
-    # token_type: str = "bearer"
+    # Token firmado para autenticar las siguientes peticiones sin reenviar la contraseña
+    access_token: str
+    token_type: str = "bearer"
 
 
 # --- Rutas de Autenticación ---
@@ -40,34 +42,39 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """
     Valida las credenciales de un usuario y devuelve los permisos asignados.
     """
-    logging.info(f"Intento de login para el usuario: {user_data.username}")
+    logger.info(f"Intento de login para el usuario: {user_data.username}")
 
     # Consulta el usuario por su nombre de usuario (sin importar mayúsculas/minúsculas)
     stmt = select(User).where(func.lower(User.username) == func.lower(user_data.username))
     user = db.scalar(stmt)
 
-    # Si el usuario existe y la contraseña es correcta...
+    # Si el usuario existe, está activo y la contraseña es correcta...
     # La función check_password debería manejar la comparación de hashes de forma segura.
-    if user and user.check_password(user_data.password):
-        # ...construye una lista de permisos
-        user_permissions = []
-        if user.is_admin:
-            user_permissions.append("admin")
+    # Un usuario desactivado no obtiene token ni entra en la caché de permisos
+    if user and user.is_active and user.check_password(user_data.password):
+        # ...construye una lista de permisos y la deja en caché para las peticiones con token
+        user_permissions = build_permission_list(user)
+        permission_cache.set(user.user_id, user.permission_version, user_permissions)
 
-        # Añade los permisos desde la tabla 'permissions'
-        for perm in user.permissions:
-            user_permissions.append(perm.name)
-
-        logging.info(f"Login exitoso para el usuario: {user_data.username}")
+        logger.info(f"Login exitoso para el usuario: {user_data.username}")
         return {
             "message": "¡Inicio de sesión exitoso!",
             "permissions": user_permissions,
-            # "access_token": "aqui_iria_un_jwt_token_real",
+            "access_token": create_access_token(user.user_id, user.permission_version),
+            "token_type": "bearer",
         }
 
     # Si el usuario no existe o la contraseña es incorrecta, lanza una excepción
-    logging.warning(f"Login fallido para el usuario: {user_data.username}")
+    logger.warning(f"Login fallido para el usuario: {user_data.username}")
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Nombre de usuario o contraseña inválidos."
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/me", response_model=CurrentSession)
+async def read_current_session(session: CurrentSession = Depends(get_current_session)):
+    """
+    Devuelve el usuario y los permisos asociados al token de acceso.
+    """
+    return session
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from sqlalchemy import select
 
 # Asumo que tus modelos y esquemas están en estos directorios.
 # Ajusta las importaciones si tu estructura de proyecto es diferente.
-from .database import get_db, Contact, Customer # Importamos Customer para verificar su existencia
+from .database import get_db, Contact, Customer, Order # Importamos Customer para verificar su existencia
 from .schemas.user import ContactResponse, ContactCreate
+from .inserts import insert_returning, integrity_errors
+from .entity_cache import cached_entity, invalidate_entities, invalidate_orders_of
 
 # El prefijo y las etiquetas ayudan a organizar la API en la documentación de Swagger/OpenAPI
 router = APIRouter()
@@ -20,29 +22,20 @@ async def create_contact(
     """
     Crea un nuevo contacto en la base de datos.
     """
-    # Paso 1: Verificar si el cliente existe en la base de datos.
-    customer = db.scalar(select(Customer).where(Customer.customer_id == contact_data.customer_id))
-    if not customer:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Customer with id {contact_data.customer_id} not found"
-        )
-    
-    # Paso 2: Preparar los datos del nuevo contacto
-    new_contact = Contact(
-        customer_id=contact_data.customer_id,
-        fname=contact_data.fname,
-        lname=contact_data.lname,
-        email=contact_data.email,
-        phone=contact_data.phone
-    )
+    # Paso 1: Insertar con RETURNING; la clave foránea verifica que el cliente exista
+    with integrity_errors(db, not_found_detail=f"Customer with id {contact_data.customer_id} not found"):
+        new_contact = insert_returning(db, Contact, dict(
+            customer_id=contact_data.customer_id,
+            fname=contact_data.fname,
+            lname=contact_data.lname,
+            email=contact_data.email,
+            phone=contact_data.phone
+        ))
+        # Se serializa antes del commit, que expira la instancia y obligaría a releerla
+        response = ContactResponse.model_validate(new_contact)
+        db.commit()
 
-    # Paso 3: Guardar el nuevo contacto en la base de datos
-    db.add(new_contact)
-    db.commit()
-    db.refresh(new_contact)
-    
-    return new_contact
+    return response
 
 
 @router.get("/{contact_id}", response_model=ContactResponse)
@@ -53,8 +46,12 @@ async def get_contact_by_id(
     """
     Obtiene un solo contacto por su ID.
     """
-    # Usamos db.get() para buscar el contacto por su ID de manera más directa
-    contact = db.get(Contact, contact_id)
+    # get() en el threadpool (con una sesión propia) solo si no está en la caché de entidades
+    def load(session: Session) -> Optional[ContactResponse]:
+        contact = session.get(Contact, contact_id)
+        return ContactResponse.model_validate(contact) if contact else None
+
+    contact = await cached_entity("contacts", contact_id, load)
 
     if not contact:
         raise HTTPException(
@@ -96,6 +93,7 @@ async def update_contact(
     contact.lname = contact_data.lname
     contact.email = contact_data.email
     contact.phone = contact_data.phone
+    invalidate_entities(db, "contacts", contact_id)
 
     db.commit()
     db.refresh(contact)
@@ -118,6 +116,9 @@ async def delete_contact(
             detail="Contact not found"
         )
     
+    # El borrado deja en NULL el contacto de sus órdenes
+    invalidate_entities(db, "contacts", contact_id)
+    invalidate_orders_of(db, Order.contact_id == contact_id)
     db.delete(contact)
     db.commit()
     
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select, func
-from typing import List
+from typing import List, Optional
 
 # Importar las clases de Pydantic desde su nuevo archivo
 from .schemas.user import UserResponse, UserUpdate, PermissionBase, CustomerResponse, CustomerUpdate, CustomerCreate, ContactResponse
 
 # Reutilizamos la dependencia get_db y los modelos
-from .database import User, Permission, Customer, get_db, Contact
+from .database import User, Permission, Customer, get_db, Contact, Order
+from .fields import sparse_fields, sparse_response
+from .inserts import insert_returning, integrity_errors
+from .entity_cache import cached_entity, invalidate_entities, invalidate_orders_of
 
 
 # --- Creación del Router ---
@@ -15,11 +18,16 @@ router = APIRouter()
 
 @router.get("/", response_model=List[CustomerResponse])
 async def get_all_customers(
+    columns: Optional[List] = Depends(sparse_fields(CustomerResponse, Customer)),
     db: Session = Depends(get_db),
 ):
     """
     Obtiene una lista de todos los clientes.
+    Con `?fields=` solo se consultan y devuelven las columnas pedidas.
     """
+    if columns:
+        return sparse_response(db.execute(select(*columns)).all())
+
     stmt = select(Customer)
     customers = db.scalars(stmt).unique().all()
     return customers
@@ -28,6 +36,7 @@ async def get_all_customers(
 @router.get("/search", response_model=List[CustomerResponse])
 async def search_customers_by_name(
     full_name: str,
+    columns: Optional[List] = Depends(sparse_fields(CustomerResponse, Customer)),
     db: Session = Depends(get_db),
 ):
     """
@@ -40,10 +49,11 @@ async def search_customers_by_name(
     full_name_db = func.concat(Customer.fname, ' ', Customer.lname)
     
     # Construir la consulta para buscar en el nombre completo concatenado o en el nombre de la compañía
-    stmt = select(Customer).where(
-        (full_name_db.ilike(search_term)) |
-        (Customer.cname.ilike(search_term))
-    )
+    condition = (full_name_db.ilike(search_term)) | (Customer.cname.ilike(search_term))
+    if columns:
+        return sparse_response(db.execute(select(*columns).where(condition)).all())
+
+    stmt = select(Customer).where(condition)
     
     customers = db.scalars(stmt).unique().all()
     
@@ -59,44 +69,48 @@ async def create_customer(
     """
     Crea un nuevo customer en la base de datos.
     """
-    # 1. Verificar si el email ya está en uso
-    existing_customer = db.scalars(
-        select(Customer).where(Customer.email == customer_data.email)
-    ).first()
-    if existing_customer:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="El email ya está en uso"
-        )
-
-    # 2. Preparar los datos del nuevo customer
-    new_customer = Customer(
-        is_company=customer_data.is_company,
-        cname=customer_data.cname,
-        fname=customer_data.fname,
-        lname=customer_data.lname,
-        address1=customer_data.address1,
-        address2=customer_data.address2,
-        email=customer_data.email,
-        phone=customer_data.phone
-    )
-
-    db.add(new_customer)
-    db.commit()
-    db.refresh(new_customer)
-    return new_customer
+    # 1. INSERT ... RETURNING en un solo viaje; la restricción única del email detecta duplicados
+    with integrity_errors(db, conflict_detail="El email ya está en uso"):
+        new_customer = insert_returning(db, Customer, dict(
+            is_company=customer_data.is_company,
+            cname=customer_data.cname,
+            fname=customer_data.fname,
+            lname=customer_data.lname,
+            address1=customer_data.address1,
+            address2=customer_data.address2,
+            email=customer_data.email,
+            phone=customer_data.phone
+        ))
+        # Se serializa antes del commit, que expira la instancia y obligaría a releerla
+        response = CustomerResponse.model_validate(new_customer)
+        db.commit()
+    return response
 
 
 @router.get("/{customer_id}", response_model=CustomerResponse)
 async def get_customer_by_id(
     customer_id: int,
+    columns: Optional[List] = Depends(sparse_fields(CustomerResponse, Customer)),
     db: Session = Depends(get_db),
 ):
     """
     Obtiene un solo customer por su ID.
     """
-    # Usamos db.get() para buscar el usuario por su ID de manera más directa
-    customer = db.get(Customer, customer_id)
+    if columns:
+        row = db.execute(select(*columns).where(Customer.customer_id == customer_id)).first()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Customer not found"
+            )
+        return sparse_response(row)
+
+    # get() en el threadpool (con una sesión propia) solo si no está en la caché de entidades
+    def load(session: Session) -> Optional[CustomerResponse]:
+        customer = session.get(Customer, customer_id)
+        return CustomerResponse.model_validate(customer) if customer else None
+
+    customer = await cached_entity("customers", customer_id, load)
 
     if not customer:
         raise HTTPException(
@@ -131,9 +145,12 @@ async def update_customer(
     for key, value in update_data.items():
         setattr(customer, key, value)
 
-    db.add(customer)
+    # La restricción única del email detecta duplicados al confirmar
+    with integrity_errors(db, conflict_detail="El email ya está en uso"):
+        db.add(customer)
+        invalidate_entities(db, "customers", customer_id)
 
-    db.commit()
+        db.commit()
     db.refresh(customer)
     return customer
 
@@ -154,6 +171,10 @@ async def delete_customer_by_id(
             detail="Customer not found"
         )
 
+    # El borrado arrastra los contactos y deja en NULL el cliente de sus órdenes
+    invalidate_entities(db, "customers", customer_id)
+    invalidate_entities(db, "contacts", *[contact.contact_id for contact in customer.contacts])
+    invalidate_orders_of(db, Order.customer_id == customer_id)
     db.delete(customer)
     db.commit()
     return
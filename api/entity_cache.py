@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .database import Order, SessionLocal
+from .metrics import ENTITY_CACHE
+from .pg_notify import listen, pg_notify
+from .single_flight import single_flight
+
+# --- Configuración (variables de entorno) ---
+ENTITY_CACHE_TTL = float(os.environ.get("ENTITY_CACHE_TTL", "30"))  # Tope de antigüedad si se pierde una notificación
+ENTITY_CACHE_SIZE = int(os.environ.get("ENTITY_CACHE_SIZE", "4096"))  # Entidades en memoria por worker
+ENTITY_CACHE_CHANNEL = "entity_cache"
+NOTIFY_PAYLOAD_LIMIT = 7900  # PostgreSQL acepta hasta 8000 bytes; si no cabe se pide vaciar las cachés
+
+logger = logging.getLogger("autoerp.entity_cache")
+
+
+class EntityCache:
+    """
+    Caché LRU con TTL de lecturas de una fila: {(entidad, clave): esquema ya validado}.
+    Guarda esquemas de Pydantic, no objetos del ORM, para poder compartirlos entre peticiones.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, entity: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get((entity, key))
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[(entity, key)]
+                entry = None
+            if entry is None:
+                ENTITY_CACHE.inc(entity, "miss")
+                return None
+            self._entries.move_to_end((entity, key))
+        ENTITY_CACHE.inc(entity, "hit")
+        return entry[1]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def set(self, entity: str, key: Hashable, generation: int, value: Any) -> None:
+        with self._lock:
+            # Si hubo una invalidación mientras se leía la BD, el valor puede ser viejo: no se guarda
+            if self._generation != generation:
+                return
+            self._entries[(entity, key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((entity, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, entity: str, keys) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop((entity, key), None) is not None:
+                    ENTITY_CACHE.inc(entity, "invalidated")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+entity_cache = EntityCache(maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+
+
+# --- Otras cachés por worker invalidadas por el mismo canal ---
+
+# {entidad: (invalidar(claves), vaciar())}; las entidades que no están aquí son de `entity_cache`
+_registered_caches: Dict[str, Tuple[Callable[[list], None], Callable[[], None]]] = {}
+
+
+def register_cache(entity: str, invalidate: Callable[[list], None], clear: Callable[[], None]) -> None:
+    """
+    Hace que `invalidate_entities(db, entity, ...)` invalide otra caché por worker (permisos, catálogos)
+    en lugar de `entity_cache`, con el mismo NOTIFY entre workers.
+    """
+    _registered_caches[entity] = (invalidate, clear)
+
+
+def _invalidate(entity: str, keys: list) -> None:
+    registered = _registered_caches.get(entity)
+    if registered is None:
+        entity_cache.invalidate(entity, keys)
+    else:
+        registered[0](keys)
+
+
+def _clear_all() -> None:
+    entity_cache.clear()
+    for _, clear in _registered_caches.values():
+        clear()
+
+
+# --- Invalidación entre workers (LISTEN/NOTIFY) ---
+
+_listener_thread: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+
+
+def _on_payload(payload: str) -> None:
+    # {entidad: [claves], ...} con todo lo invalidado por una transacción, o "*" para vaciar todo
+    try:
+        message = json.loads(payload)
+        if message == "*":
+            _clear_all()
+            return
+        for entity, keys in message.items():
+            _invalidate(entity, keys)
+    except (ValueError, AttributeError, TypeError):
+        logger.warning(f"Notificación de caché inválida: {payload[:200]}")
+
+
+def start_invalidation_listener() -> None:
+    """
+    Arranca (una vez por proceso) el hilo que aplica las invalidaciones de los demás workers.
+    Se llama al iniciar cada worker: las cachés registradas se llenan sin pasar por `cached_entity`.
+    """
+    global _listener_thread
+    if _listener_thread is None:
+        with _listener_lock:
+            if _listener_thread is None:
+                # Al (re)conectar se vacían las cachés: lo notificado mientras no se escuchaba se perdió
+                _listener_thread = threading.Thread(
+                    target=listen, args=(ENTITY_CACHE_CHANNEL, _on_payload, lambda: True, _clear_all),
+                    name="entity-cache-listener", daemon=True,
+                )
+                _listener_thread.start()
+
+
+async def cached_entity(entity: str, key: Hashable, load: Callable[[Session], Any]) -> Optional[Any]:
+    """
+    Lectura de una fila a través de la caché. Si no está, `load(session)` la consulta en el threadpool
+    (una sola vez aunque lleguen varias peticiones iguales) y debe devolver un esquema, o None si no existe.
+    Lo inexistente no se guarda, así una fila recién creada se ve al instante.
+    `load` recibe una sesión propia, no la de la petición: la carga compartida sigue corriendo aunque
+    se cancele la petición que la inició (y `get_db` cierre su sesión).
+    """
+    start_invalidation_listener()
+    value = entity_cache.get(entity, key)
+    if value is not None:
+        return value
+
+    def fill():
+        generation = entity_cache.generation()
+        with SessionLocal() as session:
+            loaded = load(session)
+        if loaded is not None:
+            entity_cache.set(entity, key, generation, loaded)
+        return loaded
+
+    return await single_flight.do(("entity", entity, key), fill)
+
+
+def invalidate_entities(db: Session, entity: str, *keys: Hashable) -> None:
+    """
+    Invalida `keys` de `entity` si la transacción de `db` confirma: en este worker al hacer commit
+    y en los demás (y en otros nodos) con un `NOTIFY` que PostgreSQL entrega junto con el commit.
+    No consulta la BD: las claves se juntan y se envían en un solo `NOTIFY` justo antes del commit.
+    """
+    keys = [key for key in keys if key is not None]
+    if not keys:
+        return
+    pending = db.info.setdefault("entity_cache_pending", {}).setdefault(entity, [])
+    pending.extend(key for key in keys if key not in pending)
+
+
+def invalidate_orders_of(db: Session, condition) -> None:
+    """
+    Invalida las órdenes que cumplen `condition`, por ID y por custom ID; para borrados que
+    la BD propaga a las órdenes (`ON DELETE SET NULL`) sin pasar por sus endpoints.
+    """
+    rows = db.execute(select(Order.order_id, Order.c_order_id).where(condition)).all()
+    invalidate_entities(db, "orders", *[row.order_id for row in rows])
+    invalidate_entities(db, "orders-by-custom-id", *[row.c_order_id for row in rows])
+
+
+# --- Listeners de la sesión ---
+
+def _before_commit(session) -> None:
+    pending = session.info.get("entity_cache_pending")
+    if not pending:
+        return
+    payload = json.dumps(pending)
+    pg_notify(session, ENTITY_CACHE_CHANNEL, payload if len(payload.encode()) <= NOTIFY_PAYLOAD_LIMIT else json.dumps("*"))
+
+
+def _after_commit(session) -> None:
+    for entity, keys in session.info.pop("entity_cache_pending", {}).items():
+        _invalidate(entity, keys)
+
+
+def _after_rollback(session) -> None:
+    session.info.pop("entity_cache_pending", None)
+
+
+def install_entity_cache(session_factory) -> None:
+    """
+    Registra en `session_factory` (SessionLocal) los listeners que envían (antes del commit)
+    y aplican (después) las invalidaciones de la transacción.
+    """
+    event.listen(session_factory, "before_commit", _before_commit)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_rollback", _after_rollback)
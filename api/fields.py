@@ -0,0 +1,60 @@
+from typing import Any, Callable, List, Optional, Type
+
+from fastapi import HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+
+
+# 1. Dependencia para "sparse fieldsets" (?fields=campo1,campo2)
+def sparse_fields(schema: Type[BaseModel], model) -> Callable[..., Optional[List[Any]]]:
+    """
+    Crea una dependencia que lee el parámetro `fields` y lo valida contra el esquema de respuesta.
+    Solo se aceptan campos del esquema que sean columnas del modelo (no relaciones anidadas).
+    Devuelve la lista de columnas para un `select(...)` o None si no se pidió proyección.
+    """
+    mapper = inspect(model)
+    allowed = {
+        name: getattr(model, name)
+        for name in schema.model_fields
+        if name in mapper.column_attrs
+    }
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description=f"Campos a devolver separados por comas. Permitidos: {', '.join(allowed)}",
+        ),
+    ) -> Optional[List[Any]]:
+        if not fields:
+            return None
+
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        if not requested:
+            return None
+
+        invalid = [name for name in requested if name not in allowed]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Campos no válidos: {', '.join(invalid)}. Permitidos: {', '.join(allowed)}",
+            )
+
+        # dict.fromkeys elimina duplicados conservando el orden pedido
+        return [allowed[name] for name in dict.fromkeys(requested)]
+
+    return dependency
+
+
+# 2. Respuesta ligera a partir de filas de columnas
+def sparse_response(rows) -> JSONResponse:
+    """
+    Serializa filas de un `select(...)` por columnas directamente a JSON.
+    Se omite el `response_model` porque el esquema completo exige campos que no se pidieron.
+    """
+    if isinstance(rows, list):
+        content = [dict(row._mapping) for row in rows]
+    else:
+        content = dict(rows._mapping)
+    return JSONResponse(content=jsonable_encoder(content))
@@ -1,15 +1,20 @@
-from passlib.context import CryptContext
+from functools import lru_cache
+
 
 # 1. Creamos un contexto de criptografía
 #    Le decimos que bcrypt es el esquema de hashing por defecto.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+#    passlib se importa al primer uso (login o alta de usuario), no en el arranque.
+@lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # 2. Función para hashear una contraseña
 def hash_password(plain_password: str) -> str:
     """
     Toma una contraseña en texto plano y devuelve su hash.
     """
-    return pwd_context.hash(plain_password)
+    return pwd_context().hash(plain_password)
 
 # 3. Función para verificar una contraseña
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -17,4 +22,4 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Compara una contraseña en texto plano con un hash almacenado.
     Devuelve True si coinciden, False si no.
     """
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context().verify(plain_password, hashed_password)
\ No newline at end of file
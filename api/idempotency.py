@@ -0,0 +1,236 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from starlette.datastructures import Headers
+
+from .database import IdempotencyKey, get_engine
+
+# --- Configuración (variables de entorno) ---
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", "86400"))  # Segundos que se recuerda una respuesta
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1024"))  # Respuestas en memoria por worker
+IDEMPOTENCY_PENDING_TIMEOUT = float(os.environ.get("IDEMPOTENCY_PENDING_TIMEOUT", "60"))  # Reclamo abandonado (worker caído)
+IDEMPOTENCY_PURGE_INTERVAL = 3600.0  # Cada cuánto un worker borra las filas vencidas
+
+MAX_KEY_LENGTH = 128
+# Encabezados que no se guardan: el servidor los vuelve a poner en cada respuesta
+UNSTORED_HEADERS = {"date", "server"}
+
+
+class StoredResponse:
+    """
+    Respuesta guardada para una clave; `status_code` None = la primera petición sigue en curso.
+    """
+
+    __slots__ = ("request_hash", "status_code", "headers", "body", "expires_at")
+
+    def __init__(self, request_hash: str, status_code: Optional[int], headers: Optional[List[List[str]]], body: Optional[bytes]):
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.headers = headers or []
+        self.body = body
+        self.expires_at = time.monotonic() + IDEMPOTENCY_TTL
+
+
+class IdempotencyCache:
+    """
+    LRU con TTL de respuestas ya completadas: {(endpoint, clave): StoredResponse}.
+    Evita ir a la BD en los reintentos que llegan al mismo worker.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._entries.get((endpoint, key))
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[(endpoint, key)]
+                return None
+            self._entries.move_to_end((endpoint, key))
+            return entry
+
+    def set(self, endpoint: str, key: str, entry: StoredResponse) -> None:
+        with self._lock:
+            self._entries[(endpoint, key)] = entry
+            self._entries.move_to_end((endpoint, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+idempotency_cache = IdempotencyCache(maxsize=IDEMPOTENCY_CACHE_SIZE)
+_last_purge = 0.0
+
+
+# --- Tabla idempotency_keys ---
+
+def claim_key(endpoint: str, key: str, request_hash: str) -> Tuple[bool, Optional[StoredResponse]]:
+    """
+    Reclama la clave con un INSERT ... ON CONFLICT en su propia transacción.
+    Devuelve (True, None) si esta petición debe ejecutarse, o (False, lo guardado) si otra ya la reclamó.
+    Una fila vencida, o un reclamo abandonado por un worker caído, se reutiliza.
+    """
+    global _last_purge
+    now = datetime.now(timezone.utc)
+    stmt = pg_insert(IdempotencyKey).values(
+        idempotency_key=key, endpoint=endpoint, request_hash=request_hash, created_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.idempotency_key, IdempotencyKey.endpoint],
+        set_={
+            "request_hash": stmt.excluded.request_hash, "created_at": stmt.excluded.created_at,
+            "status_code": None, "response_headers": None, "response_body": None,
+        },
+        where=or_(
+            IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL),
+            and_(
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT),
+            ),
+        ),
+    ).returning(IdempotencyKey.idempotency_key)
+
+    with get_engine().begin() as conn:
+        if time.monotonic() - _last_purge > IDEMPOTENCY_PURGE_INTERVAL:
+            _last_purge = time.monotonic()
+            conn.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL)))
+        if conn.execute(stmt).first() is not None:
+            return True, None
+        row = conn.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_headers, IdempotencyKey.response_body)
+            .where(IdempotencyKey.idempotency_key == key, IdempotencyKey.endpoint == endpoint)
+        ).first()
+    if row is None:  # Se borró entre el INSERT y el SELECT: que el cliente reintente
+        return False, StoredResponse(request_hash, None, None, None)
+    return False, StoredResponse(row.request_hash, row.status_code, row.response_headers, row.response_body)
+
+
+def complete_key(endpoint: str, key: str, stored: StoredResponse) -> None:
+    with get_engine().begin() as conn:
+        conn.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.idempotency_key == key, IdempotencyKey.endpoint == endpoint)
+            .values(status_code=stored.status_code, response_headers=stored.headers, response_body=stored.body)
+        )
+    idempotency_cache.set(endpoint, key, stored)
+
+
+def release_key(endpoint: str, key: str) -> None:
+    # La petición falló: se libera la clave para que el reintento se ejecute de nuevo
+    with get_engine().begin() as conn:
+        conn.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.idempotency_key == key, IdempotencyKey.endpoint == endpoint, IdempotencyKey.status_code.is_(None))
+        )
+
+
+# --- Middleware ---
+
+class IdempotencyMiddleware:
+    """
+    Middleware ASGI que respeta `Idempotency-Key` en las rutas `routes` ([(método, ruta)]).
+    La primera petición con una clave se ejecuta y su respuesta (si no es 5xx) se guarda;
+    los reintentos con la misma clave reciben esa respuesta sin ejecutar el endpoint.
+    """
+
+    def __init__(self, app, routes: Iterable[Tuple[str, str]] = ()):
+        self.app = app
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get("idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": "Invalid Idempotency-Key"}, status_code=400)(scope, receive, send)
+            return
+
+        # 1. Leer el cuerpo completo (JSON pequeño) para compararlo con el de la primera petición
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        endpoint = f"{scope['method']} {scope['path']}"
+        request_hash = hashlib.sha256(body).hexdigest()
+
+        # 2. Buscar una respuesta guardada: primero en memoria, luego reclamando la clave en la BD
+        stored = idempotency_cache.get(endpoint, key)
+        if stored is None:
+            claimed, stored = await run_in_threadpool(claim_key, endpoint, key, request_hash)
+            if claimed:
+                await self._execute(scope, receive, send, endpoint, key, request_hash, bytes(body))
+                return
+
+        if stored.request_hash != request_hash:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was already used with a different request"}, status_code=422,
+            )
+        elif stored.status_code is None:
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still being processed"},
+                status_code=409, headers={"Retry-After": "1"},
+            )
+        else:
+            # Mismos encabezados que la primera respuesta (Content-Type, ETag, Location...)
+            response = Response(content=stored.body, status_code=stored.status_code)
+            response.raw_headers = [
+                (name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers
+            ] + [(b"idempotent-replayed", b"true")]
+        await response(scope, receive, send)
+
+    async def _execute(self, scope, receive, send, endpoint: str, key: str, request_hash: str, body: bytes):
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start = {}
+        chunks = []
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(release_key, endpoint, key)
+            raise
+
+        status_code = start.get("status", 500)
+        if status_code >= 500:
+            await run_in_threadpool(release_key, endpoint, key)
+            return
+        headers = [
+            [name.decode("latin-1"), value.decode("latin-1")] for name, value in start.get("headers", [])
+            if name.decode("latin-1").lower() not in UNSTORED_HEADERS
+        ]
+        stored = StoredResponse(request_hash, status_code, headers, b"".join(chunks))
+        await run_in_threadpool(complete_key, endpoint, key, stored)
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from fastapi import HTTPException, status
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# Códigos SQLSTATE de PostgreSQL
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def insert_returning(db: Session, model: Type, values: Dict[str, Any], options: Sequence = ()):
+    """
+    `INSERT ... RETURNING` de una fila: devuelve la instancia ya cargada (ID, defaults),
+    sin `db.refresh` posterior. `options` acepta cargadores como `selectinload` para las relaciones.
+    El commit expira la instancia: lo que se vaya a responder se serializa antes.
+    """
+    return db.scalars(insert(model).values(**values).returning(model).options(*options)).one()
+
+
+def insert_many_returning(db: Session, model: Type, rows: List[Dict[str, Any]], options: Sequence = ()) -> List:
+    """
+    Inserta varias filas en una sola sentencia y las devuelve en el mismo orden que `rows`.
+    """
+    if not rows:
+        return []
+    stmt = insert(model).returning(model, sort_by_parameter_order=True).options(*options)
+    return list(db.scalars(stmt, rows).all())
+
+
+@contextmanager
+def integrity_errors(db: Session, conflict_detail: Optional[str] = None, not_found_detail: Optional[str] = None):
+    """
+    Traduce las violaciones de restricciones de la BD a respuestas HTTP:
+    clave única repetida -> 409, referencia a una fila inexistente -> 404.
+    Las restricciones hacen la verificación, sin un `select` previo.
+    """
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        code = getattr(e.orig, "pgcode", None)
+        diag = getattr(e.orig, "diag", None)
+        message = getattr(diag, "message_detail", None) or str(e.orig)
+        if code == UNIQUE_VIOLATION:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=conflict_detail or message)
+        if code == FOREIGN_KEY_VIOLATION:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found_detail or message)
+        raise
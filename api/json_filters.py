@@ -0,0 +1,57 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import cast
+from sqlalchemy.dialects.postgresql import JSONPATH
+from sqlalchemy.exc import DataError, ProgrammingError
+from sqlalchemy.orm import Session
+
+
+def parse_contains(raw: str) -> Dict[str, Any]:
+    """
+    `?contains=` es un objeto JSON; se compara con el operador `@>` (el documento lo contiene).
+    """
+    try:
+        document = json.loads(raw)
+    except ValueError:
+        document = None
+    if not isinstance(document, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="contains must be a JSON object")
+    return document
+
+
+def json_filters(column, contains: Optional[str] = None, path: Optional[str] = None) -> List:
+    """
+    Condiciones sobre una columna JSONB: `@>` con el documento de `contains` y `@?` con la ruta
+    JSONPath de `path`. Ambos operadores pueden usar un índice GIN `jsonb_path_ops`.
+    """
+    clauses = []
+    if contains is not None:
+        clauses.append(column.contains(parse_contains(contains)))
+    if path is not None:
+        clauses.append(column.op("@?")(cast(path, JSONPATH)))
+    return clauses
+
+
+def like_prefix(prefix: str) -> str:
+    """
+    Patrón LIKE `prefijo%` con los comodines escapados (se usa con `escape="/"`).
+    Armado aquí y no en SQL para que PostgreSQL vea una constante y pueda usar un índice `text_pattern_ops`.
+    """
+    return prefix.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+
+
+def search_rows(db: Session, stmt) -> List:
+    """
+    Ejecuta una búsqueda sobre JSONB; una ruta JSONPath mal formada la rechaza la BD y se responde 400.
+    """
+    try:
+        return db.scalars(stmt).all()
+    except (DataError, ProgrammingError) as e:
+        db.rollback()
+        diag = getattr(e.orig, "diag", None)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid search: {getattr(diag, 'message_primary', None) or e.orig}",
+        )
@@ -1,6 +1,10 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
-from .database import Base, engine  # Importamos la Base y el engine
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from .database import Base, SessionLocal, current_engine, on_engine_created  # El engine se crea al primer uso
 from api import auth as auth_router  # Importa el router de autenticación
 from api import users as users_router  # Importa el router de usuarios
 from api import customers as customers_router  # Importa el router de clientes
@@ -9,15 +13,44 @@ from api import employees as employees_router # Importa el router de empleados
 from api import orders as orders_router # Importa el router de órdenes
 from api import vehicles as vehicles_router # Importa el router de vehículos
 from api import appointments as appointments_router # Importa el router de citas
+from api.metrics import MetricsMiddleware, instrument_pool, render_metrics # Métricas estilo Prometheus
+from api.slow_queries import QueryContextMiddleware, install_slow_query_log # Registro de consultas lentas
+from api.profiling import ProfilingMiddleware # Perfilado de CPU por petición
+from api.response_cache import COMPRESS_LEVEL, COMPRESS_MIN_SIZE, SelectiveGZipMiddleware # Compresión de respuestas
+from api.audit import install_audit_log, shutdown_audit_writer # Auditoría de cambios en órdenes
+from api import pictures as pictures_router # Imágenes subidas (descarga y miniaturas)
+from api.pictures import shutdown_picture_pool
+from api.idempotency import IdempotencyMiddleware # Reintentos seguros de POST
+from api.entity_cache import install_entity_cache, start_invalidation_listener # Caché de entidades por worker
 
 # --- Creación de Tablas en la Base de Datos ---
 # Se hizo el cambio a Alembic, ahora Alembic maneja las migraciones.
 
+# Logs de la aplicación (autoerp.*) a la consola, sin tocar la configuración raíz del servidor
+_app_logger = logging.getLogger("autoerp")
+if not _app_logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    _app_logger.addHandler(_log_handler)
+    _app_logger.setLevel(logging.INFO)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cada worker escucha las invalidaciones de caché (entidades, permisos, catálogos) de los demás
+    start_invalidation_listener()
+    yield
+    # Al apagar: escribe los eventos de auditoría que sigan en la cola
+    await run_in_threadpool(shutdown_audit_writer)
+    # y espera las miniaturas en curso
+    await run_in_threadpool(shutdown_picture_pool)
+
+
 # Crea la instancia principal de la aplicación FastAPI
 app = FastAPI(
     title="AutoERP API",
     description="API de prueba para el proyecto de gestión.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 origins = [
@@ -27,6 +60,15 @@ origins = [
     "https://autoerp-fe.vercel.app/",
 ]
 
+# Idempotency-Key en los POST que las tablets reintentan: un reintento recibe la respuesta
+# guardada en lugar de crear un duplicado. Se registra antes que CORS para quedar dentro de él
+# (las respuestas repetidas y los 400/409/422 propios llevan los encabezados CORS) y dentro de
+# gzip/métricas: guarda la respuesta sin comprimir
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes=[("POST", "/orders/"), ("POST", "/orders/bodywork-details/"), ("POST", "/appointments/new-appointment/")],
+)
+
 # PASO 3: Añade el middleware a tu aplicación
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +78,32 @@ app.add_middleware(
     allow_headers=["*"],    # Permite todos los encabezados
 )
 
+# Compresión gzip al vuelo (en streaming) para respuestas grandes; los catálogos llegan ya
+# comprimidos desde la caché de respuestas y este middleware los deja pasar tal cual.
+# Las imágenes se sirven sin tocar (ya están comprimidas y admiten Range)
+app.add_middleware(
+    SelectiveGZipMiddleware, exclude_prefixes=("/pictures",),
+    minimum_size=COMPRESS_MIN_SIZE, compresslevel=COMPRESS_LEVEL,
+)
+
+# Métricas por ruta (conteo, latencia, tamaño de respuesta, peticiones en curso) y del pool de la BD
+app.add_middleware(MetricsMiddleware)
+on_engine_created(instrument_pool)
+
+# Registro de consultas lentas con la ruta que las originó y EXPLAIN de una muestra
+app.add_middleware(QueryContextMiddleware)
+on_engine_created(install_slow_query_log)
+
+# Auditoría de órdenes, detalles de carrocería y datos de inventario (escrita en lotes en segundo plano)
+install_audit_log(SessionLocal)
+
+# Caché de lecturas de una fila (órdenes, clientes, contactos), invalidada con NOTIFY entre workers
+# (por el mismo canal se invalidan los permisos resueltos y los catálogos de cada worker)
+install_entity_cache(SessionLocal)
+
+# Perfilado bajo demanda (X-Profile: 1 con token de administrador) o de una muestra del tráfico
+app.add_middleware(ProfilingMiddleware)
+
 
 
 
@@ -50,9 +118,18 @@ app.include_router(employees_router.router, prefix="/employees", tags=["Empleado
 app.include_router(orders_router.router, prefix="/orders", tags=["Órdenes"])
 app.include_router(vehicles_router.router, prefix="/vehicles", tags=["Vehículos"])
 app.include_router(appointments_router.router, prefix="/appointments", tags=["Citas"])
+app.include_router(pictures_router.router, prefix="/pictures", tags=["Imágenes"])
 
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Expone las métricas en formato de texto de Prometheus.
+    """
+    return PlainTextResponse(render_metrics(current_engine()), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """
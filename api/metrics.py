@@ -0,0 +1,277 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Métricas en memoria con exposición en formato de texto de Prometheus.
+# Cada proceso (worker) mantiene sus propios valores; Prometheus los agrega por instancia.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"
+            for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # {labels: [conteo por bucket..., conteo +Inf, suma]}
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = self.header()
+        for labels, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_number(cumulative)}")
+        return lines
+
+
+# --- Métricas HTTP ---
+
+REQUESTS_TOTAL = Counter("http_requests_total", "Peticiones HTTP atendidas.", ("method", "route", "status"))
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP.", ("method", "route"), LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Tamaño del cuerpo de las respuestas HTTP.", ("method", "route"), SIZE_BUCKETS
+)
+IN_PROGRESS = Gauge("http_requests_in_progress", "Peticiones HTTP en curso.", ("method",))
+
+# --- Métricas del pool de conexiones ---
+
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Tiempo para obtener una conexión del pool (incluye crearla).",
+    (), POOL_WAIT_BUCKETS,
+)
+POOL_SIZE = Gauge("db_pool_size", "Tamaño configurado del pool.")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Conexiones prestadas en este momento.")
+POOL_CHECKED_IN = Gauge("db_pool_checked_in", "Conexiones libres en el pool.")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Conexiones abiertas por encima del tamaño del pool.")
+
+# --- Métricas de la auditoría ---
+
+AUDIT_EVENTS = Counter(
+    "audit_events_total", "Eventos de auditoría por resultado (written, dropped, failed).", ("result",)
+)
+
+# --- Métricas de single-flight ---
+
+SINGLE_FLIGHT = Counter(
+    "single_flight_total", "Lecturas agrupadas: executed = consultas hechas, shared = peticiones que reutilizaron una en curso.",
+    ("result",),
+)
+
+# --- Métricas de la caché de entidades ---
+
+ENTITY_CACHE = Counter(
+    "entity_cache_total", "Lecturas de la caché de entidades por resultado (hit, miss) e invalidaciones recibidas.",
+    ("entity", "result"),
+)
+
+# --- Métricas del proceso ---
+
+PROCESS_MEMORY = Gauge(
+    "process_memory_bytes",
+    "Memoria del worker: rss = residente, pss = proporcional (las páginas compartidas se reparten), uss = solo de este proceso.",
+    ("kind",),
+)
+
+REGISTRY = [
+    REQUESTS_TOTAL, REQUEST_DURATION, RESPONSE_SIZE, IN_PROGRESS,
+    POOL_WAIT, POOL_SIZE, POOL_CHECKED_OUT, POOL_CHECKED_IN, POOL_OVERFLOW,
+    AUDIT_EVENTS, SINGLE_FLIGHT, ENTITY_CACHE, PROCESS_MEMORY,
+]
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP.
+    La ruta se etiqueta con su plantilla (`/orders/{order_id}`), no con la URL concreta,
+    para no crear una serie por cada ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        IN_PROGRESS.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_PROGRESS.dec(method)
+            # El router de FastAPI deja la ruta resuelta en el scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS_TOTAL.inc(method, route, str(status_code))
+            REQUEST_DURATION.observe(method, route, value=elapsed)
+            RESPONSE_SIZE.observe(method, route, value=size)
+
+
+# Versiones de SQLAlchemy en las que se verificó `Pool._do_get` (ver instrument_pool)
+POOL_WAIT_SQLALCHEMY_VERSIONS = ("2.0.",)
+
+
+def instrument_pool(engine) -> None:
+    """
+    Mide cuánto tarda cada checkout del pool de `engine`.
+    SQLAlchemy no tiene un evento previo al checkout (`checkout` y `connect` llegan con la conexión
+    ya entregada), así que se envuelve `Pool._do_get`, que es privado. Solo se hace en las versiones
+    verificadas; con otra versión se omite esta métrica (los gauges del pool siguen funcionando).
+    """
+    from sqlalchemy import __version__ as sqlalchemy_version
+
+    pool = engine.pool
+    do_get = getattr(pool, "_do_get", None)
+    if not sqlalchemy_version.startswith(POOL_WAIT_SQLALCHEMY_VERSIONS) or not callable(do_get):
+        logging.getLogger("autoerp.metrics").warning(
+            f"db_pool_checkout_wait_seconds desactivada: Pool._do_get no verificado en SQLAlchemy {sqlalchemy_version}"
+        )
+        return
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            POOL_WAIT.observe(value=time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+
+
+def process_memory(pid: str = "self") -> Dict[str, int]:
+    """
+    Memoria de un proceso en bytes según /proc/<pid>/smaps_rollup (Linux): rss, pss y uss.
+    Con workers que comparten páginas copy-on-write, uss es lo que de verdad cuesta cada uno.
+    Fuera de Linux solo se informa el rss máximo.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                name, _, rest = line.partition(":")
+                if rest.strip().endswith("kB"):
+                    fields[name] = int(rest.split()[0]) * 1024
+    except OSError:
+        import resource
+        return {"rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def render_metrics(engine=None) -> str:
+    """
+    Genera el texto de exposición; los gauges del pool y de memoria se leen en el momento del scrape.
+    """
+    for kind, value in process_memory().items():
+        PROCESS_MEMORY.set(kind, value=value)
+    pool = getattr(engine, "pool", None)
+    if pool is not None and hasattr(pool, "checkedout"):
+        POOL_SIZE.set(value=pool.size())
+        POOL_CHECKED_OUT.set(value=pool.checkedout())
+        POOL_CHECKED_IN.set(value=pool.checkedin())
+        POOL_OVERFLOW.set(value=max(pool.overflow(), 0))
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
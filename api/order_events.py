@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from .pg_notify import listen, pg_notify
+from .schemas.user import OrderResponse
+
+# --- Configuración (variables de entorno) ---
+ORDER_EVENTS_CHANNEL = "order_events"
+ORDER_EVENTS_HEARTBEAT = float(os.environ.get("ORDER_EVENTS_HEARTBEAT", "15"))  # Segundos entre comentarios keep-alive
+ORDER_EVENTS_CLIENT_BUFFER = int(os.environ.get("ORDER_EVENTS_CLIENT_BUFFER", "100"))  # Eventos pendientes por cliente
+
+logger = logging.getLogger("autoerp.order_events")
+
+
+def notify_order_event(db: Session, event: str, order) -> None:
+    """
+    Emite `NOTIFY order_events` dentro de la transacción de `db`: PostgreSQL solo lo entrega
+    si la transacción confirma, así que nadie ve cambios revertidos.
+    """
+    payload = json.dumps({
+        "event": event,
+        "order": OrderResponse.model_validate(order).model_dump(mode="json"),
+    })
+    pg_notify(db, ORDER_EVENTS_CHANNEL, payload)
+
+
+class OrderEventHub:
+    """
+    Un único LISTEN por worker que reparte cada notificación a todos los clientes conectados.
+    El hilo del listener arranca con el primer cliente y se reconecta si se pierde la conexión.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=ORDER_EVENTS_CLIENT_BUFFER)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name="order-events-listener", daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = {item for item in self._subscribers if item[1] is not queue}
+
+    def publish(self, payload: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, payload)
+
+    def _deliver(self, queue: asyncio.Queue, payload: Optional[str]) -> None:
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se le desconecta (None) en vez de acumular memoria
+            self.unsubscribe(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _active(self) -> bool:
+        with self._lock:
+            return bool(self._subscribers)
+
+    def _listen(self) -> None:
+        while True:
+            listen(ORDER_EVENTS_CHANNEL, self.publish, self._active)
+            with self._lock:
+                # Un cliente pudo suscribirse después de la última verificación: se sigue escuchando.
+                # `_thread` se libera solo aquí, bajo el lock, así subscribe nunca arranca un segundo hilo.
+                if self._subscribers:
+                    continue
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                return
+
+
+order_event_hub = OrderEventHub()
+
+
+async def order_event_stream(request):
+    """
+    Generador de server-sent events: un evento `order` por notificación y un comentario
+    keep-alive cada ORDER_EVENTS_HEARTBEAT segundos para que proxies no corten la conexión.
+    """
+    queue = order_event_hub.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=ORDER_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if payload is None:
+                return
+            yield f"event: order\ndata: {payload}\n\n"
+    finally:
+        order_event_hub.unsubscribe(queue)
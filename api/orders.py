@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from sqlalchemy import select, func
+from sqlalchemy import Float, cast, select, func, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
 from .database import get_db, Order, OrderExtraItems, OrderExtraInfo, BodyworkDetailTypes, BodyworkDetails, OrderInventoryData
-from sqlalchemy.orm import joinedload, Session
-from .schemas.user import CreateOrder, OrderResponse, OrderUpdate, OrderExtraItemsResponse, OrderExtraInfoCreate, OrderExtraInfoResponse, BodyworkDetailTypesResponse, BodyworkDetailTypesCreate, BodyworkDetailsResponse, BodyworkDetailsCreate, BodyworkDetailTypesUpdate, BodyworkDetailsUpdate, InventoryTypesResponse, InventoryTypesCreate, InventoryItemsCreate, InventoryItemsResponse, InventoryItemsByTypeResponse, InventoryItemReorder, OrderInventoryDataCreate, OrderInventoryDataResponse, InventoryTypesReorder, InventoryTypesUpdate, InventoryItemsUpdate
-from .database import InventoryTypes, InventoryItems, OrderInventoryData
+from sqlalchemy.orm import contains_eager, joinedload, selectinload, Session
+from .schemas.user import CreateOrder, OrderResponse, OrderUpdate, OrderExtraItemsResponse, OrderExtraInfoCreate, OrderExtraInfoResponse, BodyworkDetailTypesResponse, BodyworkDetailTypesCreate, BodyworkDetailsResponse, BodyworkDetailsCreate, BodyworkDetailTypesUpdate, BodyworkDetailsUpdate, InventoryTypesResponse, InventoryTypesCreate, InventoryItemsCreate, InventoryItemsResponse, InventoryItemsByTypeResponse, InventoryItemReorder, OrderInventoryDataCreate, OrderInventoryDataResponse, InventoryTypesReorder, InventoryTypesUpdate, InventoryItemsUpdate, OrderStatsResponse, InventoryTemplateTypeResponse, OrderInventoryDataByTypeResponse, BodyworkHeatmapResponse, BodyworkChecklistView, PictureUploadResponse
+from .database import InventoryTypes, InventoryItems, OrderInventoryData, OrderStat
+from .fields import sparse_fields, sparse_response
+from .response_cache import catalog_response
+from .order_events import notify_order_event, order_event_stream
+from .audit import record_change, record_insert
+from .inserts import insert_many_returning, insert_returning, integrity_errors
+from .json_filters import json_filters, search_rows
+from .pictures import receive_picture
+from .entity_cache import cached_entity, invalidate_entities
 
 router = APIRouter()
 
@@ -22,93 +35,299 @@ async def create_order(
     # Convierte el objeto de Pydantic a un diccionario. Esto incluirá todos
     order_dict = order_data.model_dump()
 
-    # Crea una nueva instancia de la clase de la base de datos
-    # usando el diccionario. Esto garantiza que todos los campos
-    # de Pydantic se asignen correctamente.
-    new_order = Order(**order_dict)
+    # INSERT ... RETURNING con el diccionario: un solo viaje devuelve la orden con su ID.
+    # La restricción única de c_order_id y las claves foráneas validan en el mismo INSERT.
+    with integrity_errors(db, conflict_detail=f"Order {order_data.c_order_id} already exists"):
+        new_order = insert_returning(db, Order, order_dict)
+        # El INSERT directo no pasa por el flush del ORM: se audita y avisa aquí
+        record_insert(db, new_order)
+        notify_order_event(db, "created", new_order)
+        # Se serializa antes del commit, que expira la instancia y obligaría a releerla
+        response = OrderResponse.model_validate(new_order)
+        db.commit()
 
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+    return response
+
+def _parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Extrae la versión de `If-Match: "3"` (también `W/"3"`). Sin encabezado o con `*` no se verifica.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid If-Match: expected the order version, e.g. "3"')
 
-    return new_order
 
 @router.patch("/{order_id}", response_model=OrderResponse)
 async def update_order(
     order_id: int,
     order_data: OrderUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
     """
-    Actualiza una orden existente de forma parcial.
+    Actualiza una orden existente de forma parcial con una sola sentencia
+    `UPDATE ... WHERE version = ? RETURNING`.
+    La versión esperada llega en `If-Match` (o en el campo `version`); si la orden cambió
+    desde que el cliente la leyó, responde 409 en lugar de pisar el otro cambio.
     """
-    order = db.get(Order, order_id)
-    if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    orders = Order.__table__
 
-    # Convierte el modelo Pydantic a un diccionario, excluyendo campos no enviados
+    # 1. Campos enviados y versión esperada (el encabezado tiene prioridad sobre el cuerpo)
     update_data = order_data.model_dump(exclude_unset=True)
+    body_version = update_data.pop("version", None)
+    expected_version = _parse_if_match(if_match)
+    if expected_version is None:
+        expected_version = body_version
+
+    # La restricción única de c_order_id y las claves foráneas validan en el mismo UPDATE (409 / 404)
+    conflict_detail = f"Order {update_data['c_order_id']} already exists" if "c_order_id" in update_data else None
+
+    if not update_data:
+        row = db.execute(select(orders).where(orders.c.order_id == order_id)).first()
+    else:
+        # 2. UPDATE condicionado a la versión. `old` bloquea la fila y devuelve los valores previos para la auditoría.
+        old_columns = [orders.c.order_id, *[orders.c[key] for key in update_data]]
+        old = select(*old_columns).where(orders.c.order_id == order_id).with_for_update().subquery("old")
+        stmt = (
+            update(orders)
+            .where(orders.c.order_id == old.c.order_id)
+            .values(**update_data, version=orders.c.version + 1)
+            .returning(*orders.c, *[old.c[key].label(f"old_{key}") for key in update_data])
+        )
+        if expected_version is not None:
+            stmt = stmt.where(orders.c.version == expected_version)
+        with integrity_errors(db, conflict_detail=conflict_detail):
+            row = db.execute(stmt).first()
+
+    # 3. Sin fila: la orden no existe o su versión ya no es la esperada
+    if row is None or (not update_data and expected_version not in (None, row.version)):
+        current_version = row.version if row is not None else db.scalar(select(orders.c.version).where(orders.c.order_id == order_id))
+        if current_version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Order was modified by someone else (current version {current_version}); reload it and retry.",
+            headers={"ETag": f'"{current_version}"'},
+        )
 
-    # Actualiza los campos del objeto de la base de datos
-    for key, value in update_data.items():
-        setattr(order, key, value)
-
-    db.commit()
-    db.refresh(order)
+    # 4. Auditoría y aviso a los tableros, en la misma transacción
+    if update_data:
+        changes = {key: [row._mapping[f"old_{key}"], row._mapping[key]] for key in update_data
+                   if row._mapping[f"old_{key}"] != row._mapping[key]}
+        if changes:
+            record_change(db, "orders", order_id, "update", changes, order_id=order_id)
+        notify_order_event(db, "updated", row)
+        invalidate_entities(db, "orders", order_id)
+        invalidate_entities(db, "orders-by-custom-id", row.c_order_id, row._mapping.get("old_c_order_id"))
+        with integrity_errors(db, conflict_detail=conflict_detail):
+            db.commit()
 
-    return order
+    response.headers["ETag"] = f'"{row.version}"'
+    return row
 
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_all_orders(
+    columns: Optional[List] = Depends(sparse_fields(OrderResponse, Order)),
     db: Session = Depends(get_db),
 ):
     """
     Obtiene una lista de todas las órdenes.
+    Con `?fields=` solo se consultan y devuelven las columnas pedidas.
     """
+    if columns:
+        return sparse_response(db.execute(select(*columns)).all())
+
     stmt = select(Order)
     orders = db.scalars(stmt).unique().all()
     return orders
 
 
+@router.get("/events", response_class=StreamingResponse)
+async def stream_order_events(request: Request):
+    """
+    Canal de server-sent events con las órdenes creadas o actualizadas, para reemplazar
+    el sondeo de GET /orders/. Cada evento `order` trae `{"event": ..., "order": {...}}`.
+    """
+    return StreamingResponse(
+        order_event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats", response_model=OrderStatsResponse)
+async def get_order_stats(
+    db: Session = Depends(get_db),
+):
+    """
+    Conteo de órdenes por estado operativo, estado administrativo, prioridad, asesor y mecánico.
+    Se lee de la tabla resumen `order_stats` (mantenida por triggers), así que el costo
+    no depende de cuántas órdenes haya en el historial.
+    """
+    stats = {"op_status": [], "adm_status": [], "priority": [], "advisor": [], "mechanic": []}
+    stmt = select(OrderStat).where(OrderStat.order_count != 0).order_by(OrderStat.dimension, OrderStat.value_id)
+    for row in db.scalars(stmt):
+        if row.dimension in stats:
+            stats[row.dimension].append({"id": row.value_id or None, "count": row.order_count})
+
+    # Cada orden cuenta una vez en cada dimensión: el total es la suma de cualquiera de ellas
+    total = sum(item["count"] for item in stats["op_status"])
+    return {"total": total, **stats}
+
+
+@router.get("/inventory-template", response_model=List[InventoryTemplateTypeResponse])
+async def get_inventory_template(
+    request: Request,
+):
+    """
+    Plantilla del checklist de recepción: todos los tipos de inventario activos con sus ítems,
+    ambos ordenados por posición, en una sola respuesta.
+    Se construye con una sola consulta y se sirve desde la caché de catálogos (con ETag);
+    cualquier alta, cambio o reordenamiento de tipos o ítems la invalida.
+    """
+    stmt = (
+        select(InventoryTypes)
+        .outerjoin(InventoryTypes.items)
+        .options(contains_eager(InventoryTypes.items))
+        .where(InventoryTypes.is_active.is_(True))
+        .order_by(InventoryTypes.position, InventoryItems.position)
+    )
+    return await catalog_response(
+        request, "inventory", List[InventoryTemplateTypeResponse],
+        lambda session: session.scalars(stmt).unique().all(), key="template",
+    )
+
+
+@router.get("/bodywork-heatmap", response_model=BodyworkHeatmapResponse)
+async def get_bodywork_heatmap(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    view: Optional[BodyworkChecklistView] = None,
+    detail_type_id: Optional[int] = None,
+    bins: int = Query(20, ge=1, le=200),
+    x_min: float = 0.0,
+    x_max: float = 1.0,
+    y_min: float = 0.0,
+    y_max: float = 1.0,
+    db: Session = Depends(get_db),
+):
+    """
+    Mapa de calor de daños: cuenta los detalles de carrocería de las órdenes del rango de fechas
+    en una cuadrícula de `bins` x `bins` celdas por vista y tipo de detalle.
+    El agrupado en celdas (`width_bucket`) y el conteo se hacen en SQL: a Python solo llegan
+    las celdas no vacías, sin importar cuántos detalles haya.
+    Los puntos fuera de [min, max] se cuentan en la celda del borde.
+    """
+    if x_max <= x_min or y_max <= y_min:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid coordinate range")
+
+    # 1. Celda (0..bins-1) de cada eje; width_bucket devuelve 0 o bins+1 fuera de rango
+    def cell(axis: str, low: float, high: float):
+        bucket = func.width_bucket(BodyworkDetails.coordinates[axis].astext.cast(Float), low, high, bins)
+        return func.least(func.greatest(bucket, 1), bins) - 1
+
+    cell_x = cell("x", x_min, x_max).label("cell_x")
+    cell_y = cell("y", y_min, y_max).label("cell_y")
+    stmt = (
+        select(BodyworkDetails.view, BodyworkDetails.detail_type_id, cell_x, cell_y, func.count())
+        .join(Order, Order.order_id == BodyworkDetails.order_id)
+        .where(BodyworkDetails.coordinates.has_key("x"), BodyworkDetails.coordinates.has_key("y"))
+        .group_by(BodyworkDetails.view, BodyworkDetails.detail_type_id, cell_x, cell_y)
+    )
+    if date_from is not None:
+        stmt = stmt.where(Order.order_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Order.order_date < date_to)
+    if view is not None:
+        stmt = stmt.where(BodyworkDetails.view == view)
+    if detail_type_id is not None:
+        stmt = stmt.where(BodyworkDetails.detail_type_id == detail_type_id)
+
+    # 2. Armar una cuadrícula densa por (vista, tipo) con las celdas devueltas
+    grids = {}
+    for row_view, row_type, x, y, count in db.execute(stmt):
+        grid = grids.get((row_view, row_type))
+        if grid is None:
+            grid = grids[(row_view, row_type)] = {
+                "view": row_view, "detail_type_id": row_type, "total": 0,
+                "counts": [[0] * bins for _ in range(bins)],
+            }
+        grid["counts"][y][x] += count
+        grid["total"] += count
+
+    ordered = sorted(grids.values(), key=lambda g: (g["view"].value, g["detail_type_id"] or 0))
+    return {"bins": bins, "x_range": [x_min, x_max], "y_range": [y_min, y_max], "grids": ordered}
+
+
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order_by_id(
     order_id: int,
+    response: Response,
+    columns: Optional[List] = Depends(sparse_fields(OrderResponse, Order)),
     db: Session = Depends(get_db),
 ):
     """
-    Obtiene orden por ID
+    Obtiene orden por ID. El encabezado ETag lleva la versión que se usa en If-Match al editarla.
+    Se sirve desde la caché de entidades; se invalida al editar la orden (en todos los workers).
     """
-    order = db.get(Order, order_id)
+    if columns:
+        row = db.execute(select(*columns).where(Order.order_id == order_id)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return sparse_response(row)
+
+    def load(session: Session) -> Optional[OrderResponse]:
+        order = session.get(Order, order_id)
+        return OrderResponse.model_validate(order) if order else None
+
+    order = await cached_entity("orders", order_id, load)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    response.headers["ETag"] = f'"{order.version}"'
     return order
 
 
 @router.get("/customId/{c_order_id}", response_model=OrderResponse)
 async def get_order_by_custom_id(
     c_order_id: str,
+    columns: Optional[List] = Depends(sparse_fields(OrderResponse, Order)),
     db: Session = Depends(get_db),
 ):
     """
-    Obtiene orden por el custom_ID
+    Obtiene orden por el custom_ID (a través de la caché de entidades)
     """
-    stmt = select(Order).where(Order.c_order_id == c_order_id)
-    order = db.scalars(stmt).first()
+    if columns:
+        row = db.execute(select(*columns).where(Order.c_order_id == c_order_id)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail=f"Order with custom ID '{c_order_id}' not found")
+        return sparse_response(row)
+
+    def load(session: Session) -> Optional[OrderResponse]:
+        order = session.scalars(select(Order).where(Order.c_order_id == c_order_id)).first()
+        return OrderResponse.model_validate(order) if order else None
+
+    order = await cached_entity("orders-by-custom-id", c_order_id, load)
     if not order:
         raise HTTPException(status_code=404, detail=f"Order with custom ID '{c_order_id}' not found")
     return order
 
 @router.get("/extra-items/", response_model=List[OrderExtraItemsResponse])
 async def get_all_order_extra_items(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene todos los ítems extra de órdenes.
     """
     stmt = select(OrderExtraItems)
-    items = db.scalars(stmt).all()
-    return items
+    return await catalog_response(request, "extra-items", List[OrderExtraItemsResponse], lambda session: session.scalars(stmt).all())
 
 @router.get("/extra-info/{order_id}", response_model=List[OrderExtraInfoResponse])
 async def get_order_extra_info(
@@ -167,14 +386,13 @@ async def upsert_order_extra_info(
 
 @router.get("/bodywork-detail-types/", response_model=List[BodyworkDetailTypesResponse])
 async def get_all_bodywork_detail_types(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene todos los tipos de detalle de carrocería.
     """
     stmt = select(BodyworkDetailTypes)
-    detail_types = db.scalars(stmt).all()
-    return detail_types
+    return await catalog_response(request, "bodywork-detail-types", List[BodyworkDetailTypesResponse], lambda session: session.scalars(stmt).all())
 
 @router.post("/bodywork-detail-types/", response_model=BodyworkDetailTypesResponse, status_code=status.HTTP_201_CREATED)
 async def create_bodywork_detail_type(
@@ -184,11 +402,12 @@ async def create_bodywork_detail_type(
     """
     Crea un nuevo tipo de detalle de carrocería.
     """
-    new_detail_type = BodyworkDetailTypes(**detail_type_data.model_dump())
-    db.add(new_detail_type)
-    db.commit()
-    db.refresh(new_detail_type)
-    return new_detail_type
+    with integrity_errors(db, conflict_detail="Bodywork detail type already exists"):
+        new_detail_type = insert_returning(db, BodyworkDetailTypes, detail_type_data.model_dump())
+        response = BodyworkDetailTypesResponse.model_validate(new_detail_type)
+        invalidate_entities(db, "catalogs", "bodywork-detail-types")
+        db.commit()
+    return response
 
 @router.patch("/bodywork-detail-types/{detail_type_id}", response_model=BodyworkDetailTypesResponse)
 async def update_bodywork_detail_type(
@@ -211,6 +430,7 @@ async def update_bodywork_detail_type(
     for key, value in update_data.items():
         setattr(detail_type, key, value)
 
+    invalidate_entities(db, "catalogs", "bodywork-detail-types")
     db.commit()
     db.refresh(detail_type)
     return detail_type
@@ -252,6 +472,28 @@ async def update_bodywork_detail(
     db.refresh(detail)
     return detail
 
+@router.post("/bodywork-details/{detail_id}/picture", response_model=PictureUploadResponse)
+async def upload_bodywork_detail_picture(
+    detail_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    Sube la foto de un detalle de carrocería (`multipart/form-data`, campo `file`) y guarda su ruta.
+    La imagen se recibe antes de abrir la transacción: la conexión no queda ocupada durante la subida.
+    """
+    picture = await receive_picture(request)
+
+    detail = db.get(BodyworkDetails, detail_id)
+    if not detail:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Bodywork Detail with ID {detail_id} not found."
+        )
+    detail.picture_path = picture.picture_path
+    db.commit()
+    return picture
+
 @router.delete("/bodywork-details/{detail_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_bodywork_detail(
     detail_id: int,
@@ -281,25 +523,20 @@ async def create_bodywork_details(
     Crea una o más entradas en la lista de verificación de carrocería para una orden.
     Acepta una lista de objetos de checklist.
     """
-    created_items = []
-    for item_data in detail_items:
-        # (Opcional pero recomendado) Verificar que las FKs existan para cada item
-        if not db.get(Order, item_data.order_id):
-            raise HTTPException(status_code=404, detail=f"Order with ID {item_data.order_id} not found.")
-        if not db.get(BodyworkDetailTypes, item_data.detail_type_id):
-            raise HTTPException(status_code=404, detail=f"Bodywork Detail Type with ID {item_data.detail_type_id} not found.")
-
-        new_item = BodyworkDetails(**item_data.model_dump())
-        db.add(new_item)
-        created_items.append(new_item)
-
-    db.commit()
-
-    # Refrescar cada objeto para obtener los IDs generados por la base de datos
-    for item in created_items:
-        db.refresh(item)
+    # Un solo INSERT ... RETURNING para toda la lista; las claves foráneas
+    # rechazan órdenes o tipos inexistentes (404 con el detalle de la BD).
+    with integrity_errors(db):
+        # El tipo de cada detalle (parte de la respuesta) llega con una sola consulta `IN` para todo el lote
+        created_items = insert_many_returning(
+            db, BodyworkDetails, [item.model_dump() for item in detail_items],
+            options=[selectinload(BodyworkDetails.detail_type)],
+        )
+        for item in created_items:
+            record_insert(db, item)
+        response = [BodyworkDetailsResponse.model_validate(item) for item in created_items]
+        db.commit()
 
-    return created_items
+    return response
 
 @router.get("/order-exists/{c_order_id}", response_model=bool)
 async def check_order_exists(
@@ -333,31 +570,27 @@ async def create_inventory_type(
     """
     Crea un nuevo tipo de inventario. La posición se asigna automáticamente.
     """
-    # Calcular la siguiente posición
-    max_position_stmt = select(func.max(InventoryTypes.position))
-    max_position = db.scalar(max_position_stmt)
-    
-    next_position = (max_position + 1) if max_position is not None else 0
+    # La siguiente posición (max + 1, o 0 si no hay tipos) se calcula dentro del mismo INSERT
+    next_position = select(func.coalesce(func.max(InventoryTypes.position) + 1, 0)).scalar_subquery()
 
-    # Crear el nuevo tipo de inventario con la posición calculada
-    new_inventory_type = InventoryTypes(
-        **inventory_type.model_dump(), position=next_position
-    )
-    db.add(new_inventory_type)
-    db.commit()
-    db.refresh(new_inventory_type)
-    return new_inventory_type
+    with integrity_errors(db):
+        new_inventory_type = insert_returning(db, InventoryTypes, dict(
+            **inventory_type.model_dump(), position=next_position
+        ))
+        response = InventoryTypesResponse.model_validate(new_inventory_type)
+        invalidate_entities(db, "catalogs", "inventory")
+        db.commit()
+    return response
 
 @router.get("/inventory-types/", response_model=List[InventoryTypesResponse])
 async def get_all_inventory_types(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene todos los tipos de inventario.
     """
     stmt = select(InventoryTypes).order_by(InventoryTypes.position)
-    inventory_types = db.scalars(stmt).all()
-    return inventory_types
+    return await catalog_response(request, "inventory", List[InventoryTypesResponse], lambda session: session.scalars(stmt).all(), key="types")
 
 @router.patch("/inventory-types/{inv_type_id}", response_model=InventoryTypesResponse)
 async def update_inventory_type(
@@ -376,10 +609,30 @@ async def update_inventory_type(
     for key, value in update_data.items():
         setattr(inventory_type, key, value)
 
+    invalidate_entities(db, "catalogs", "inventory")
     db.commit()
     db.refresh(inventory_type)
     return inventory_type
 
+@router.post("/inventory-types/{inv_type_id}/picture", response_model=PictureUploadResponse)
+async def upload_inventory_type_picture(
+    inv_type_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    Sube la imagen de un tipo de inventario (`multipart/form-data`, campo `file`) y guarda su ruta.
+    """
+    picture = await receive_picture(request)
+
+    inventory_type = db.get(InventoryTypes, inv_type_id)
+    if not inventory_type:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory type not found")
+    inventory_type.picture_path = picture.picture_path
+    invalidate_entities(db, "catalogs", "inventory")
+    db.commit()
+    return picture
+
 @router.put("/inventory-types/reorder", status_code=status.HTTP_200_OK)
 async def reorder_inventory_types(
     reorder_data: List[InventoryTypesReorder],
@@ -405,6 +658,7 @@ async def reorder_inventory_types(
         for inv_type in types_to_update:
             inv_type.position = position_map[inv_type.inv_type_id]
         
+        invalidate_entities(db, "catalogs", "inventory")
         db.commit() # Guardar todos los cambios en una sola transacción.
     except Exception as e:
         db.rollback() # Si algo falla, revertir todos los cambios.
@@ -420,46 +674,47 @@ async def create_inventory_item(
     """
     Crea un nuevo ítem de inventario. La posición se asigna automáticamente al final de la lista.
     """
-    # 1. Calcular la siguiente posición para el tipo de inventario dado.
-    # Se busca la posición máxima actual y se le suma 1.
-    max_position_stmt = select(func.max(InventoryItems.position)).where(
-        InventoryItems.inv_type_id == inventory_item.inv_type_id
-    )
-    max_position = db.scalar(max_position_stmt)
-    
+    # 1. Calcular la siguiente posición para el tipo de inventario dado, dentro del mismo INSERT.
     # Si no hay ítems, la nueva posición es 0. De lo contrario, es max + 1.
-    next_position = (max_position + 1) if max_position is not None else 0
-
-    # 2. Crear el nuevo ítem con la posición calculada.
-    new_inventory_item = InventoryItems(
-        **inventory_item.model_dump(exclude_defaults=True), 
-        position=next_position
-    )
-    db.add(new_inventory_item)
-    db.commit()
-    db.refresh(new_inventory_item)
-    return new_inventory_item
+    next_position = select(func.coalesce(func.max(InventoryItems.position) + 1, 0)).where(
+        InventoryItems.inv_type_id == inventory_item.inv_type_id
+    ).scalar_subquery()
+
+    # 2. Crear el nuevo ítem con la posición calculada; la clave foránea verifica el tipo.
+    with integrity_errors(db, not_found_detail=f"Inventory type with id {inventory_item.inv_type_id} not found"):
+        new_inventory_item = insert_returning(db, InventoryItems, dict(
+            **inventory_item.model_dump(exclude_defaults=True),
+            position=next_position
+        ), options=[selectinload(InventoryItems.inventory_type)])
+        response = InventoryItemsResponse.model_validate(new_inventory_item)
+        invalidate_entities(db, "catalogs", "inventory")
+        db.commit()
+    return response
 
 @router.get("/inventory-items/{inv_type_id}", response_model=InventoryItemsByTypeResponse)
 async def get_inventory_items_by_type(
     inv_type_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene un tipo de inventario y todos sus ítems asociados.
+    La respuesta se sirve desde la caché de catálogos mientras el inventario no cambie.
     """
-    # 1. Obtener el tipo de inventario.
-    inventory_type = db.get(InventoryTypes, inv_type_id)
-    if not inventory_type:
-        raise HTTPException(status_code=404, detail="Inventory type not found")
+    def build(session: Session):
+        # 1. Obtener el tipo de inventario.
+        inventory_type = session.get(InventoryTypes, inv_type_id)
+        if not inventory_type:
+            raise HTTPException(status_code=404, detail="Inventory type not found")
+
+        # 2. Obtener todos los ítems asociados a ese tipo.
+        # No necesitamos cargar la relación aquí porque ya tenemos el objeto inventory_type.
+        stmt = select(InventoryItems).where(InventoryItems.inv_type_id == inv_type_id)
+        items = session.scalars(stmt).all()
 
-    # 2. Obtener todos los ítems asociados a ese tipo.
-    # No necesitamos cargar la relación aquí porque ya tenemos el objeto inventory_type.
-    stmt = select(InventoryItems).where(InventoryItems.inv_type_id == inv_type_id)
-    items = db.scalars(stmt).all()
+        # 3. Construir la respuesta estructurada.
+        return {"inventory_type": inventory_type, "items": items}
 
-    # 3. Construir y devolver la respuesta estructurada.
-    return {"inventory_type": inventory_type, "items": items}
+    return await catalog_response(request, "inventory", InventoryItemsByTypeResponse, build, key=f"items:{inv_type_id}")
 
 @router.put("/inventory-items/reorder", status_code=status.HTTP_200_OK)
 async def reorder_inventory_items(
@@ -486,6 +741,7 @@ async def reorder_inventory_items(
         for item in items_to_update:
             item.position = position_map[item.item_id]
         
+        invalidate_entities(db, "catalogs", "inventory")
         db.commit() # Guardar todos los cambios en una sola transacción.
     except Exception as e:
         db.rollback() # Si algo falla, revertir todos los cambios.
@@ -530,6 +786,7 @@ async def update_inventory_items(
                     setattr(item, key, value)
         
         # 5. Guardar todos los cambios en una transacción atómica.
+        invalidate_entities(db, "catalogs", "inventory")
         db.commit()
         
         # 6. Refrescar los objetos para obtener el estado final de la BD.
@@ -589,6 +846,64 @@ async def upsert_order_inventory_data(
 
     return processed_entries
 
+@router.post("/inventory-data/{order_id}/{item_id}/picture", response_model=PictureUploadResponse)
+async def upload_order_inventory_picture(
+    order_id: int,
+    item_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    Sube la foto de un ítem de inventario con `picture_upload` para una orden (`multipart/form-data`,
+    campo `file`). La ruta se guarda como `picture_path` dentro de `data`, conservando el resto del valor.
+    """
+    picture = await receive_picture(request)
+
+    item = db.get(InventoryItems, item_id)
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory item not found")
+    if not item.picture_upload:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inventory item does not accept pictures")
+
+    # Upsert en una sentencia: crea la entrada o mezcla la ruta en su `data` (operador ||)
+    stmt = pg_insert(OrderInventoryData).values(
+        order_id=order_id, item_id=item_id, data={"picture_path": picture.picture_path},
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="_order_item_uc",
+        set_={"data": func.coalesce(OrderInventoryData.data, cast({}, JSONB)).op("||")(stmt.excluded.data)},
+    ).returning(OrderInventoryData.data_id, OrderInventoryData.data)
+    with integrity_errors(db, not_found_detail=f"Order with ID {order_id} not found"):
+        entry = db.execute(stmt).one()
+        # El upsert directo no pasa por el flush del ORM: se audita aquí
+        record_change(db, "order_inventory_data", entry.data_id, "update", {"data": entry.data}, order_id=order_id)
+        db.commit()
+    return picture
+
+@router.get("/inventory-data/search", response_model=List[OrderInventoryDataResponse])
+async def search_order_inventory_data(
+    contains: Optional[str] = None,
+    path: Optional[str] = None,
+    item_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Busca datos de inventario en todas las órdenes.
+    - `contains`: objeto JSON que `data` debe contener (`@>`), p. ej. `{"value": "damaged"}`.
+    - `path`: expresión JSONPath que debe encontrar algo en `data` (`@?`), p. ej. `$.value ? (@ == "damaged")`.
+    - `item_id`: limita la búsqueda a un ítem del checklist.
+    Ambas condiciones usan el índice GIN `jsonb_path_ops` de `data`. Las más recientes primero.
+    """
+    clauses = json_filters(OrderInventoryData.data, contains, path)
+    if not clauses:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide contains or path")
+    if item_id is not None:
+        clauses.append(OrderInventoryData.item_id == item_id)
+
+    stmt = select(OrderInventoryData).where(*clauses).order_by(OrderInventoryData.order_id.desc()).limit(limit)
+    return search_rows(db, stmt)
+
 @router.get("/inventory-data/{order_id}/{inv_type_id}", response_model=List[OrderInventoryDataResponse])
 async def get_order_inventory_data(
     order_id: int,
@@ -598,16 +913,34 @@ async def get_order_inventory_data(
     """
     Obtiene todas las entradas de datos de inventario para una orden y tipo de inventario específicos.
     """
-    # 1. Obtener los item_ids que pertenecen al inv_type_id
-    item_ids_stmt = select(InventoryItems.item_id).where(InventoryItems.inv_type_id == inv_type_id)
-    item_ids = db.scalars(item_ids_stmt).all()
-    if not item_ids:
-        return [] # Si no hay items para ese tipo, no hay datos que devolver.
-
-    # 2. Obtener los datos de la orden que coincidan con esos item_ids
-    stmt = select(OrderInventoryData).where(
-        OrderInventoryData.order_id == order_id,
-        OrderInventoryData.item_id.in_(item_ids)
+    # Un solo JOIN con inventory_items filtra por tipo (antes: item_ids y luego los datos)
+    stmt = (
+        select(OrderInventoryData)
+        .join(InventoryItems, InventoryItems.item_id == OrderInventoryData.item_id)
+        .where(OrderInventoryData.order_id == order_id, InventoryItems.inv_type_id == inv_type_id)
     )
     data_entries = db.scalars(stmt).all()
-    return data_entries
\ No newline at end of file
+    return data_entries
+
+
+@router.get("/inventory-data/{order_id}", response_model=List[OrderInventoryDataByTypeResponse])
+async def get_all_order_inventory_data(
+    order_id: int,
+    db: Session = Depends(get_db),
+):
+    """
+    Obtiene todas las entradas de datos de inventario de una orden, agrupadas por tipo de inventario.
+    Una sola consulta (filtra por el índice de order_id y une con inventory_items para conocer el tipo)
+    en lugar de una llamada por tipo.
+    """
+    stmt = (
+        select(InventoryItems.inv_type_id, OrderInventoryData)
+        .join(InventoryItems, InventoryItems.item_id == OrderInventoryData.item_id)
+        .where(OrderInventoryData.order_id == order_id)
+        .order_by(InventoryItems.inv_type_id, InventoryItems.position)
+    )
+    # Las filas llegan ordenadas por tipo: se agrupan en una pasada
+    return [
+        {"inv_type_id": inv_type_id, "entries": [entry for _, entry in rows]}
+        for inv_type_id, rows in groupby(db.execute(stmt).all(), key=itemgetter(0))
+    ]
@@ -0,0 +1,113 @@
+import threading
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .database import Permission, user_permissions
+
+
+# --- Mapa en memoria nombre de permiso -> permission_id ---
+# Los permisos casi nunca cambian, así que se guardan en el proceso tras la primera consulta.
+_permission_ids: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def resolve_permission_ids(db: Session, names: Iterable[str]) -> List[int]:
+    """
+    Convierte nombres de permisos en IDs con una sola consulta `IN` para los que no estén en caché,
+    y un único INSERT masivo para los nombres que aún no existen.
+    """
+    names = list(dict.fromkeys(names))  # Sin duplicados, conservando el orden
+    with _lock:
+        ids = {name: _permission_ids[name] for name in names if name in _permission_ids}
+
+    missing = [name for name in names if name not in ids]
+    if missing:
+        rows = db.execute(
+            select(Permission.name, Permission.permission_id).where(Permission.name.in_(missing))
+        ).all()
+        found = {name: permission_id for name, permission_id in rows}
+        with _lock:
+            _permission_ids.update(found)
+        ids.update(found)
+
+        unknown = [name for name in missing if name not in found]
+        if unknown:
+            # ON CONFLICT cubre la carrera con otra petición que cree el mismo permiso a la vez.
+            # Estos IDs no se guardan en caché: la transacción aún puede revertirse.
+            created = db.execute(
+                pg_insert(Permission)
+                .values([{"name": name} for name in unknown])
+                .on_conflict_do_nothing(index_elements=["name"])
+                .returning(Permission.name, Permission.permission_id)
+            ).all()
+            ids.update({name: permission_id for name, permission_id in created})
+
+            raced = [name for name in unknown if name not in ids]
+            if raced:
+                ids.update(dict(db.execute(
+                    select(Permission.name, Permission.permission_id).where(Permission.name.in_(raced))
+                ).all()))
+
+    return [ids[name] for name in names]
+
+
+def forget_permission_ids(names: Iterable[str]) -> None:
+    """
+    Quita nombres del mapa en memoria (p. ej. un permiso borrado o recreado con otro ID).
+    """
+    with _lock:
+        for name in names:
+            _permission_ids.pop(name, None)
+
+
+def _insert_permissions(db: Session, user_id: int, *where) -> List[str]:
+    """
+    INSERT ... SELECT de los permisos que cumplen `where`: los IDs se leen de la tabla en la misma
+    sentencia. Devuelve los nombres asignados (CTE con `INSERT ... RETURNING`).
+    """
+    inserted = (
+        insert(user_permissions)
+        .from_select(["user_id", "permission_id"], select(literal(user_id), Permission.permission_id).where(*where))
+        .returning(user_permissions.c.permission_id)
+        .cte("inserted")
+    )
+    return list(db.scalars(
+        select(Permission.name).join(inserted, inserted.c.permission_id == Permission.permission_id)
+    ).all())
+
+
+def set_user_permissions(db: Session, user_id: int, names: Iterable[str], replace: bool = True) -> List[str]:
+    """
+    Asigna los permisos indicados al usuario escribiendo directamente la tabla de asociación.
+    Devuelve los nombres asignados (sin duplicados).
+    El mapa en memoria solo evita consultar qué nombres existen; los IDs se insertan por nombre,
+    así que un ID viejo del mapa nunca llega a la tabla.
+    """
+    names = list(dict.fromkeys(names))
+    if replace:
+        db.execute(delete(user_permissions).where(user_permissions.c.user_id == user_id))
+    if not names:
+        return names
+
+    resolve_permission_ids(db, names)  # Crea los nombres que aún no existen
+    assigned = set(_insert_permissions(db, user_id, Permission.name.in_(names)))
+    stale = [name for name in names if name not in assigned]
+    if stale:
+        # El mapa decía que existían pero se borraron: se vuelven a resolver (y crear)
+        forget_permission_ids(stale)
+        resolve_permission_ids(db, stale)
+        _insert_permissions(db, user_id, Permission.name.in_(stale))
+    return names
+
+
+def set_all_user_permissions(db: Session, user_id: int, replace: bool = True) -> List[str]:
+    """
+    Asigna todos los permisos existentes con un INSERT ... SELECT, sin cargar filas en Python.
+    Devuelve los nombres asignados, leídos en la misma sentencia (CTE con `INSERT ... RETURNING`).
+    """
+    if replace:
+        db.execute(delete(user_permissions).where(user_permissions.c.user_id == user_id))
+    return _insert_permissions(db, user_id)
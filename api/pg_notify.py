@@ -0,0 +1,56 @@
+import logging
+import select as select_module
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .database import get_engine
+
+logger = logging.getLogger("autoerp.pg_notify")
+
+
+def pg_notify(db: Session, channel: str, payload: str) -> None:
+    """
+    `NOTIFY` dentro de la transacción de `db`: PostgreSQL solo lo entrega si la transacción
+    confirma, así que nadie se entera de cambios revertidos.
+    """
+    db.execute(select(func.pg_notify(channel, payload)))
+
+
+def listen(channel: str, on_payload: Callable[[str], None], active: Callable[[], bool],
+           on_connect: Optional[Callable[[], None]] = None) -> None:
+    """
+    Bucle bloqueante (para un hilo propio) que hace LISTEN en `channel` y llama a `on_payload`
+    por cada notificación mientras `active()` sea verdadero; retorna en cuanto devuelve falso.
+    Se reconecta si se pierde la conexión; `on_connect` se llama en cada (re)conexión,
+    p. ej. para descartar lo que pudo perderse.
+    """
+    backoff = 1.0
+    while active():
+        try:
+            # Conexión propia, fuera del pool: queda ocupada mientras dure el LISTEN
+            raw = get_engine().raw_connection()
+            raw.detach()
+            conn = raw.driver_connection
+            conn.autocommit = True
+            try:
+                conn.cursor().execute(f"LISTEN {channel}")
+                backoff = 1.0
+                if on_connect is not None:
+                    on_connect()
+                while True:
+                    if not active():
+                        return
+                    if select_module.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        on_payload(conn.notifies.pop(0).payload)
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"LISTEN {channel} desconectado: {e}; reintentando en {backoff:.0f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
@@ -0,0 +1,330 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+
+from .schemas.user import PictureUploadResponse
+
+# --- Configuración (variables de entorno) ---
+PICTURES_DIR = os.environ.get("PICTURES_DIR", "media/pictures")
+PICTURE_MAX_BYTES = int(os.environ.get("PICTURE_MAX_BYTES", str(25 * 1024 * 1024)))
+PICTURE_WORKERS = int(os.environ.get("PICTURE_WORKERS", "2"))  # Procesos para generar miniaturas
+# Variantes reducidas: "nombre:lado_máximo" separados por comas
+PICTURE_VARIANTS: Tuple[Tuple[str, int], ...] = tuple(
+    (name, int(size))
+    for name, _, size in (item.strip().partition(":") for item in os.environ.get("PICTURE_VARIANTS", "thumb:320,medium:1600").split(","))
+    if name and size
+)
+
+PICTURE_CACHE_CONTROL = "public, max-age=31536000, immutable"  # El contenido de una ruta nunca cambia
+PICTURE_WRITE_CHUNK = 1024 * 1024  # Bytes que se juntan antes de parsear, hashear y escribir en el threadpool
+
+logger = logging.getLogger("autoerp.pictures")
+
+router = APIRouter()
+
+# Extensión -> content type. El formato se detecta por la firma del archivo, no por lo que declara el cliente.
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "heic": "image/heic",
+}
+
+
+def _sniff(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"hevc", b"mif1"):
+        return "heic"
+    return None
+
+
+# Solo rutas generadas por receive_picture: evita salir de PICTURES_DIR
+PICTURE_PATH_RE = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.(jpg|png|webp|heic)$")
+
+
+def picture_file(relative_path: str) -> str:
+    return os.path.join(PICTURES_DIR, relative_path)
+
+
+def variant_path(relative_path: str, name: str) -> str:
+    """
+    Ruta de la variante `name` de una imagen: `ab/cd/<sha>_<name>.jpg`.
+    """
+    stem = relative_path.rsplit(".", 1)[0]
+    return f"{stem}_{name}.jpg"
+
+
+# --- Recepción en streaming ---
+
+class _PictureReceiver:
+    """
+    Callbacks del parser multipart: el campo de archivo se escribe en disco por fragmentos
+    mientras se calcula su hash, sin acumular la imagen en memoria.
+    Son llamadas bloqueantes (disco, sha256): el parser se alimenta desde el threadpool.
+    """
+
+    def __init__(self, field: str, tmp_dir: str):
+        self.field = field.encode()
+        self.tmp_dir = tmp_dir
+        self.file = None
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.received = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self):
+        from python_multipart.multipart import parse_options_header
+
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # Solo el primer archivo del campo esperado; el resto de las partes se ignora
+        self._in_file = not self.received and params.get(b"name") == self.field and b"filename" in params
+        if self._in_file:
+            self.file = tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if not self._in_file:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > PICTURE_MAX_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Picture is too large")
+        if len(self.head) < 16:
+            self.head += chunk[:16 - len(self.head)]
+        self.hasher.update(chunk)
+        self.file.write(chunk)
+
+    def on_part_end(self):
+        if self._in_file:
+            self.file.close()
+            self._in_file = False
+            self.received = True
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            try:
+                os.unlink(self.file.name)
+            except FileNotFoundError:
+                pass
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+
+def _store(receiver: _PictureReceiver, target: str) -> bool:
+    """
+    Mueve el temporal a `target`; devuelve False si la imagen ya estaba guardada (se descarta el duplicado).
+    """
+    if os.path.exists(target):
+        receiver.discard()
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(receiver.file.name, target)
+    return True
+
+
+async def receive_picture(request: Request, field: str = "file") -> PictureUploadResponse:
+    """
+    Lee una imagen de un cuerpo `multipart/form-data` a medida que llega y la guarda en
+    almacenamiento direccionado por contenido (`ab/cd/<sha256>.<ext>`): la misma imagen
+    subida dos veces se guarda una sola vez. Luego programa sus variantes reducidas.
+    """
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    # 1. Validar encabezados antes de leer el cuerpo
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Expected multipart/form-data")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > PICTURE_MAX_BYTES + 64 * 1024:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Picture is too large")
+
+    # 2. Escribir el archivo en un temporal del mismo disco (el rename final es atómico).
+    # El parser (que escribe y hashea) corre en el threadpool con bloques de ~1 MiB: el event loop
+    # solo recibe los fragmentos y sigue atendiendo otras peticiones mientras tanto
+    tmp_dir = os.path.join(PICTURES_DIR, "tmp")
+    await run_in_threadpool(os.makedirs, tmp_dir, exist_ok=True)
+    receiver = _PictureReceiver(field, tmp_dir)
+    parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= PICTURE_WRITE_CHUNK:
+                await run_in_threadpool(parser.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(parser.write, bytes(buffer))
+        await run_in_threadpool(parser.finalize)
+    except MultipartParseError:
+        await run_in_threadpool(receiver.discard)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body")
+    except BaseException:
+        receiver.discard()
+        raise
+
+    if not receiver.received:
+        await run_in_threadpool(receiver.discard)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Missing file field '{field}'")
+    extension = _sniff(receiver.head)
+    if extension is None:
+        await run_in_threadpool(receiver.discard)
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported picture format")
+
+    # 3. Mover a su ruta por hash; si ya existía, el duplicado se descarta
+    digest = receiver.hasher.hexdigest()
+    relative_path = f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+    if await run_in_threadpool(_store, receiver, picture_file(relative_path)):
+        schedule_variants(relative_path)
+
+    return PictureUploadResponse(
+        picture_path=relative_path, sha256=digest, size=receiver.size, content_type=CONTENT_TYPES[extension],
+    )
+
+
+# --- Variantes en un pool de procesos ---
+
+def _make_variants(source: str, targets: List[Tuple[str, int]]) -> List[str]:
+    """
+    Se ejecuta en otro proceso: genera cada variante JPEG (lado máximo `size`) de `source`.
+    """
+    from PIL import Image, ImageOps
+    from pillow_heif import register_heif_opener
+
+    # Las fotos HEIC de los teléfonos necesitan el decodificador de pillow-heif
+    register_heif_opener()
+
+    created = []
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for target, size in targets:
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            tmp_target = f"{target}.tmp"
+            variant.save(tmp_target, format="JPEG", quality=82, optimize=True)
+            os.replace(tmp_target, target)
+            created.append(target)
+    return created
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn: los hijos no heredan conexiones ni hilos (auditoría, LISTEN) del worker
+        _pool = ProcessPoolExecutor(max_workers=PICTURE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _log_variant_result(future) -> None:
+    error = future.exception()
+    if error is not None:
+        logger.error(f"No se pudieron generar las variantes de una imagen: {error}")
+
+
+def schedule_variants(relative_path: str) -> None:
+    """
+    Encola la generación de variantes sin esperar el resultado: la respuesta de la subida no
+    depende de ellas, y el trabajo de CPU no ocupa el event loop ni los hilos del worker.
+    """
+    if not PICTURE_VARIANTS:
+        return
+    targets = [(picture_file(variant_path(relative_path, name)), size) for name, size in PICTURE_VARIANTS]
+    future = _get_pool().submit(_make_variants, picture_file(relative_path), targets)
+    future.add_done_callback(_log_variant_result)
+
+
+def shutdown_picture_pool() -> None:
+    """
+    Espera a que terminen las variantes en curso y detiene el pool. Se llama al apagar la app.
+    """
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+# --- Descarga ---
+
+@router.api_route("/{picture_path:path}", methods=["GET", "HEAD"], response_class=FileResponse)
+async def get_picture(
+    picture_path: str,
+    variant: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Sirve una imagen guardada (o su variante, p. ej. `?variant=thumb`) directo desde el disco.
+    - La ruta incluye el hash del contenido: el ETag es el hash y la respuesta se cachea como inmutable.
+    - Soporta `Range` (y `If-Range`) y `If-None-Match` -> 304.
+    - FileResponse envía el archivo por fragmentos o con `pathsend` si el servidor lo soporta,
+      sin cargarlo completo en memoria.
+    """
+    match = PICTURE_PATH_RE.match(picture_path)
+    if match is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Picture not found")
+    digest, extension = match.group(3), match.group(4)
+
+    relative_path, etag, media_type = picture_path, f'"{digest}"', CONTENT_TYPES[extension]
+    cache_control = PICTURE_CACHE_CONTROL
+    if variant is not None:
+        if variant not in dict(PICTURE_VARIANTS):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown variant '{variant}'")
+        candidate = variant_path(picture_path, variant)
+        if await run_in_threadpool(os.path.exists, picture_file(candidate)):
+            relative_path, etag, media_type = candidate, f'"{digest}-{variant}"', "image/jpeg"
+        else:
+            # Variante aún no generada (o que no se pudo generar): se sirve el original sin fijarlo en caché
+            cache_control = "no-cache"
+
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        stat_result = await run_in_threadpool(os.stat, picture_file(relative_path))
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Picture not found")
+    return FileResponse(picture_file(relative_path), media_type=media_type, headers=headers, stat_result=stat_result)
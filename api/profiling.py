@@ -0,0 +1,205 @@
+import asyncio
+import io
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi.concurrency import run_in_threadpool
+
+# --- Configuración (variables de entorno) ---
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))  # Fracción de tráfico perfilada en segundo plano
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "2"))  # Intervalo del muestreo de pilas
+PROFILE_TOP_FUNCTIONS = 40
+
+logger = logging.getLogger("autoerp.profiling")
+
+# Solo se perfila una petición a la vez: cProfile y el muestreo observan todo el hilo del event loop.
+_profile_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8192)
+def _code_label(code) -> str:
+    filename = code.co_filename
+    # Rutas cortas: desde el paquete (api/..., fastapi/..., sqlalchemy/...)
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _frame_label(frame) -> str:
+    return _code_label(frame.f_code)
+
+
+class StackSampler:
+    """
+    Muestrea periódicamente la pila de un hilo y acumula pilas colapsadas
+    (formato de flamegraph.pl / speedscope: "raíz;...;hoja conteo").
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _write_profile(name: str, profiler, sampler: StackSampler, meta: str) -> None:
+    """
+    Guarda el perfil: .collapsed (flamegraph), .txt (funciones más costosas) y .prof (pstats crudo).
+    """
+    try:
+        _dump_profile(name, profiler, sampler, meta)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el perfil {name}: {e}")
+
+
+def _dump_profile(name: str, profiler, sampler: StackSampler, meta: str) -> None:
+    import pstats
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+
+    with open(base + ".collapsed", "w") as f:
+        f.write(sampler.collapsed())
+
+    output = io.StringIO()
+    output.write(meta + "\n\n")
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    stats.sort_stats("tottime").print_stats(PROFILE_TOP_FUNCTIONS)
+    with open(base + ".txt", "w") as f:
+        f.write(output.getvalue())
+
+    stats.dump_stats(base + ".prof")
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _profile_requested(scope) -> bool:
+    """
+    Perfilado bajo demanda: `X-Profile: 1` o `?profile=1`. Solo mira la petición, sin tocar la BD.
+    """
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return _header(scope, b"x-profile") == "1" or query.get("profile", [None])[0] == "1"
+
+
+def _requested_by_admin(scope) -> bool:
+    """
+    El perfilado bajo demanda solo se concede a administradores. Puede consultar la BD,
+    así que se ejecuta en el threadpool; cualquier error cuenta como "no es administrador".
+    """
+    authorization = _header(scope, b"authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+
+    from .database import SessionLocal
+    from .sessions import session_from_token
+
+    try:
+        db = SessionLocal()
+        try:
+            session = session_from_token(token, db)
+        finally:
+            db.close()
+    except Exception as e:  # El perfilado nunca debe tumbar la petición
+        logger.warning(f"No se pudo verificar el permiso de perfilado: {e}")
+        return False
+    return session is not None and "admin" in session.permissions
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que ejecuta una petición bajo cProfile y un muestreador de pilas,
+    a pedido de un administrador o para una fracción aleatoria del tráfico.
+    Nota: con endpoints async, el perfil incluye lo que otras peticiones ejecuten
+    en el mismo event loop mientras dura la petición perfilada.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        requested = not sampled and _profile_requested(scope) and await run_in_threadpool(_requested_by_admin, scope)
+        if not (sampled or requested) or not _profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        name = "{:%Y%m%d-%H%M%S}-{}-{}-{:06x}".format(
+            datetime.now(timezone.utc), scope["method"],
+            re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root", random.getrandbits(24),
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        import cProfile  # Solo cuando se perfila: no cuesta en el arranque
+
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        started = time.perf_counter()
+        try:
+            sampler.start()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+                sampler.stop()
+        finally:
+            _profile_lock.release()
+
+        route = getattr(scope.get("route"), "path", scope["path"])
+        meta = (f"{scope['method']} {route} ({scope['path']}) "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms, "
+                f"{'muestra' if sampled else 'bajo demanda'}")
+        # La escritura a disco se hace fuera del event loop
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, _write_profile, name, profiler, sampler, meta)
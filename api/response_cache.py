@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from starlette.middleware.gzip import GZipMiddleware
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .entity_cache import register_cache
+from .single_flight import single_flight
+
+# --- Configuración (variables de entorno) ---
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "60"))  # Tope de antigüedad si se pierde una notificación
+CATALOG_CACHE_SIZE = int(os.environ.get("CATALOG_CACHE_SIZE", "256"))
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))  # Bytes; por debajo no vale la pena comprimir
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", "6"))  # Nivel de gzip para la compresión al vuelo
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """
+    GZip al vuelo excepto en las rutas de `exclude_prefixes`: las imágenes ya vienen comprimidas
+    y pasarlas por gzip rompería `Range` y obligaría a leerlas en Python.
+    """
+
+    def __init__(self, app, exclude_prefixes: Tuple[str, ...] = (), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+@lru_cache(maxsize=None)
+def _brotli():
+    # brotli es opcional: si no está instalado solo se ofrece gzip
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+class CachedPayload:
+    """
+    Un catálogo ya serializado, con sus variantes comprimidas calculadas una sola vez.
+    """
+
+    __slots__ = ("expires_at", "etag", "variants")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.expires_at = time.monotonic() + ttl
+        # El ETag depende solo del contenido: es el mismo en todos los workers
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= COMPRESS_MIN_SIZE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            brotli = _brotli()
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            encodings[name.strip().lower()] = q
+    return encodings
+
+
+def negotiate_encoding(header: Optional[str], available) -> str:
+    """
+    Elige la codificación de `available` con mayor q en `Accept-Encoding` (br antes que gzip si empatan).
+    """
+    if not header:
+        return "identity"
+    accepted = _accepted_encodings(header)
+    best, best_q = "identity", 0.0
+    for encoding in ("br", "gzip"):
+        if encoding in available:
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+    return best
+
+
+class CatalogCache:
+    """
+    Caché LRU con TTL de respuestas de catálogos: {(grupo, clave): CachedPayload}.
+    Las rutas que modifican un catálogo invalidan su grupo completo en todos los workers
+    con `invalidate_entities(db, "catalogs", grupo)`.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], CachedPayload]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._clears = 0
+        self._lock = threading.Lock()
+
+    def get(self, group: str, key: str) -> Optional[CachedPayload]:
+        with self._lock:
+            entry = self._entries.get((group, key))
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[(group, key)]
+                return None
+            self._entries.move_to_end((group, key))
+            return entry
+
+    def version(self, group: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._clears, self._versions.get(group, 0)
+
+    def set(self, group: str, key: str, version: Tuple[int, int], entry: CachedPayload) -> None:
+        with self._lock:
+            # Si el grupo se invalidó (o la caché se vació) mientras se construía la respuesta, no se guarda
+            if (self._clears, self._versions.get(group, 0)) != version:
+                return
+            self._entries[(group, key)] = entry
+            self._entries.move_to_end((group, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, groups) -> None:
+        with self._lock:
+            for group in groups:
+                self._versions[group] = self._versions.get(group, 0) + 1
+                for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == group]:
+                    del self._entries[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clears += 1
+            self._entries.clear()
+
+
+catalog_cache = CatalogCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+register_cache("catalogs", catalog_cache.invalidate, catalog_cache.clear)
+
+
+def _build_entry(group: str, key: str, schema: Any, build: Callable[[Session], Any]) -> CachedPayload:
+    version = catalog_cache.version(group)
+    # Sesión propia: la construcción compartida sigue aunque se cancele la petición que la inició
+    with SessionLocal() as session:
+        body = _adapter(schema).dump_json(_adapter(schema).validate_python(build(session), from_attributes=True))
+    entry = CachedPayload(body, catalog_cache.ttl)
+    catalog_cache.set(group, key, version, entry)
+    return entry
+
+
+async def catalog_response(request: Request, group: str, schema: Any, build: Callable[[Session], Any], key: str = "") -> Response:
+    """
+    Devuelve un catálogo desde la caché, ya comprimido según `Accept-Encoding`.
+    Si no está en caché, `build(session)` lo consulta con una sesión propia (no la de la petición)
+    y se serializa con `schema` (igual que `response_model`);
+    las peticiones que llegan mientras tanto esperan esa misma construcción (single-flight).
+    """
+    entry = catalog_cache.get(group, key)
+    if entry is None:
+        entry = await single_flight.do(("catalog", group, key), lambda: _build_entry(group, key, schema, build))
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), entry.variants)
+    # Cada representación tiene su propio ETag fuerte
+    etag = f'"{entry.etag}"' if encoding == "identity" else f'"{entry.etag}-{encoding}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.variants[encoding], media_type="application/json", headers=headers)
@@ -142,6 +142,7 @@ class OrderResponse(BaseModel):
     has_extra_info: Optional[bool] = None
     fuel_level: Optional[int] = None
     service_bay: Optional[str] = None
+    version: Optional[int] = None  # Se envía de vuelta en If-Match (o en el cuerpo) al hacer PATCH
     
 
 class OrderUpdate(BaseModel):
@@ -161,6 +162,21 @@ class OrderUpdate(BaseModel):
     has_extra_info: Optional[bool] = None
     fuel_level: Optional[int] = None
     service_bay: Optional[str] = None
+    version: Optional[int] = None  # Versión leída; alternativa al encabezado If-Match
+
+class OrderStatsCount(BaseModel):
+    id: Optional[int] = None  # None = órdenes sin asignar
+    count: int
+
+
+class OrderStatsResponse(BaseModel):
+    total: int
+    op_status: List[OrderStatsCount] = []
+    adm_status: List[OrderStatsCount] = []
+    priority: List[OrderStatsCount] = []
+    advisor: List[OrderStatsCount] = []
+    mechanic: List[OrderStatsCount] = []
+
 
 class OrderExtraItemsResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -322,6 +338,25 @@ class BodyworkDetailsResponse(BaseModel):
     detail_notes: Optional[str] = None
     picture_path: Optional[str] = None
 
+class BodyworkHeatmapGrid(BaseModel):
+    view: BodyworkChecklistView
+    detail_type_id: Optional[int] = None
+    total: int
+    counts: List[List[int]]  # counts[fila y][columna x]
+
+
+class BodyworkHeatmapResponse(BaseModel):
+    bins: int
+    x_range: List[float]
+    y_range: List[float]
+    grids: List[BodyworkHeatmapGrid] = []
+
+class PictureUploadResponse(BaseModel):
+    picture_path: str  # Relativa al directorio de imágenes (PICTURES_DIR)
+    sha256: str
+    size: int
+    content_type: str
+
 class BodyworkDetailsUpdate(BaseModel):
     view: Optional[BodyworkChecklistView] = None
     detail_type_id: Optional[int] = None
@@ -401,6 +436,10 @@ class InventoryItemsByTypeResponse(BaseModel):
     inventory_type: InventoryTypesResponse
     items: List[InventoryItemStrippedResponse]
 
+# Plantilla completa del checklist: cada tipo activo con sus ítems ya ordenados.
+class InventoryTemplateTypeResponse(InventoryTypesResponse):
+    items: List[InventoryItemStrippedResponse] = []
+
 class InventoryItemReorder(BaseModel):
     item_id: int
     position: int
@@ -417,6 +456,11 @@ class OrderInventoryDataResponse(BaseModel):
     item_id: int
     data: Optional[Dict[str, Any]] = None
 
+# Datos de inventario de una orden agrupados por tipo de inventario.
+class OrderInventoryDataByTypeResponse(BaseModel):
+    inv_type_id: int
+    entries: List[OrderInventoryDataResponse]
+
 class AppointmentCreate(BaseModel):
     # IDs para cuando la cita la crea un empleado para un cliente existente
     customer_id: Optional[int] = None
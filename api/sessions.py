@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from .database import User, get_db
+from .entity_cache import register_cache
+from .tokens import decode_access_token
+
+
+# --- Caché de permisos resueltos ---
+
+class PermissionCache:
+    """
+    Caché LRU con TTL de los permisos resueltos por usuario: {user_id: (versión, permisos)}.
+    `update_user` y `delete_user_by_id` la invalidan en todos los workers con
+    `invalidate_entities(db, "permissions", user_id)`; el TTL solo acota una notificación perdida.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, int, Tuple[str, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, permission_version: int) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, version, permissions = entry
+            if expires_at < time.monotonic() or version != permission_version:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return list(permissions)
+
+    def set(self, user_id: int, permission_version: int, permissions: List[str]) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, permission_version, tuple(permissions))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+permission_cache = PermissionCache(
+    maxsize=int(os.environ.get("PERMISSION_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("PERMISSION_CACHE_TTL", "300")),
+)
+register_cache("permissions", permission_cache.invalidate, permission_cache.clear)
+
+
+def build_permission_list(user: User) -> List[str]:
+    """
+    Construye la lista de permisos de un usuario ("admin" primero si aplica).
+    """
+    user_permissions = []
+    if user.is_admin:
+        user_permissions.append("admin")
+    for perm in user.permissions:
+        user_permissions.append(perm.name)
+    return user_permissions
+
+
+# --- Dependencia de sesión ---
+
+class CurrentSession(BaseModel):
+    user_id: int
+    permissions: List[str]
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def session_from_token(token: str, db: Session) -> Optional[CurrentSession]:
+    """
+    Resuelve un token de acceso a su sesión, o None si no es válido.
+    Si los permisos están en caché solo cuesta verificar la firma; la sesión de BD
+    únicamente abre conexión cuando hay que recargarlos.
+    """
+    claims = decode_access_token(token)
+    if claims is None:
+        return None
+
+    user_id, permission_version = claims["sub"], claims["pv"]
+    permissions = permission_cache.get(user_id, permission_version)
+    if permissions is None:
+        user = db.get(User, user_id)
+        # Si el usuario se desactivó o sus permisos cambiaron después de emitir el token, el token ya no es válido.
+        if not user or not user.is_active or user.permission_version != permission_version:
+            return None
+        permissions = build_permission_list(user)
+        permission_cache.set(user_id, permission_version, permissions)
+
+    return CurrentSession(user_id=user_id, permissions=permissions)
+
+
+def get_current_session(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: Session = Depends(get_db),
+) -> CurrentSession:
+    """
+    Valida el token `Authorization: Bearer ...` y devuelve el usuario con sus permisos.
+    """
+    session = session_from_token(credentials.credentials, db) if credentials else None
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o expirado.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return session
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+from fastapi.concurrency import run_in_threadpool
+
+from .metrics import SINGLE_FLIGHT
+
+
+class SingleFlight:
+    """
+    Agrupa lecturas idénticas concurrentes dentro del worker: la primera petición con una clave
+    ejecuta `fn` en el threadpool y las que llegan mientras tanto esperan ese mismo resultado,
+    así una ráfaga de peticiones iguales hace una sola consulta.
+
+    Solo para lecturas (las rutas se suman explícitamente): quien se une a una lectura en curso
+    puede recibir datos de hasta una consulta atrás. El resultado se comparte entre peticiones,
+    así que `fn` debe devolver algo que no dependa de su sesión (esquemas, bytes), no objetos del ORM.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            SINGLE_FLIGHT.inc("executed")
+            # Tarea propia: si el cliente que la inició se desconecta, los demás siguen esperándola
+            task = asyncio.ensure_future(run_in_threadpool(fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            SINGLE_FLIGHT.inc("shared")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Marca el error como recuperado aunque ya no quede nadie esperando
+
+
+single_flight = SingleFlight()
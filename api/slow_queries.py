@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import event
+
+# --- Configuración (variables de entorno) ---
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "200"))  # 0 desactiva el registro
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))  # Fracción con EXPLAIN
+SLOW_QUERY_EXPLAIN_COOLDOWN = float(os.environ.get("SLOW_QUERY_EXPLAIN_COOLDOWN", "300"))  # Segundos por sentencia
+SLOW_QUERY_EXPLAIN_TRACKED = 1024  # Sentencias distintas cuya espera se recuerda a la vez
+SLOW_QUERY_LOG_PATH = os.environ.get("SLOW_QUERY_LOG_PATH", "logs/slow_queries.log")
+
+logger = logging.getLogger("autoerp.slow_queries")
+
+# Scope ASGI de la petición en curso, para saber qué ruta lanzó la consulta
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+class QueryContextMiddleware:
+    """
+    Middleware ASGI que guarda el scope de la petición en un ContextVar.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
+
+
+def _current_route() -> Optional[str]:
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    # Cuando la consulta se ejecuta el router ya resolvió la plantilla de la ruta
+    route = getattr(scope.get("route"), "path", scope.get("path"))
+    return f"{scope.get('method')} {route}"
+
+
+def _redact(parameters: Any) -> Any:
+    """
+    Sustituye los valores de los parámetros por su tipo; nunca se escriben datos de clientes.
+    """
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return {"executemany": len(parameters), "first": _redact(parameters[0])}
+        return [f"<{type(value).__name__}>" for value in parameters]
+    return None
+
+
+# Líneas del plan que muestran condiciones (Filter, One-Time Filter, Index Cond, Sort Key...): ahí PostgreSQL
+# imprime los valores ya sustituidos, porque psycopg2 los interpola en el texto antes de enviarlo
+_PLAN_CONDITION_LINE = re.compile(r"^(?!\s*Rows Removed)\s*[\w -]*(?:Cond|Filter|Key):")
+_PLAN_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<!\$)\b\d+(?:\.\d+)?\b")
+
+
+def _redact_plan(plan: str) -> str:
+    """
+    Sustituye las constantes de las líneas de condición por `?`: el plan conserva qué columnas
+    y operadores se usan, pero no los datos de clientes (emails, nombres) de los parámetros.
+    """
+    return "\n".join(
+        _PLAN_LITERAL.sub("?", line) if _PLAN_CONDITION_LINE.match(line) else line
+        for line in plan.split("\n")
+    )
+
+
+def _file_logger() -> logging.Logger:
+    """
+    Configura el archivo rotativo la primera vez que se necesita (no al importar).
+    Si no se puede escribir en disco, los registros van al logging normal.
+    """
+    if not logger.handlers:
+        from logging.handlers import RotatingFileHandler
+
+        try:
+            directory = os.path.dirname(SLOW_QUERY_LOG_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(SLOW_QUERY_LOG_PATH, maxBytes=10 * 1024 * 1024, backupCount=5)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        except OSError:
+            logger.addHandler(logging.NullHandler())
+            logger.propagate = True
+    return logger
+
+
+# --- EXPLAIN en segundo plano ---
+
+_explain_queue: "queue.Queue" = queue.Queue(maxsize=100)
+_explain_thread: Optional[threading.Thread] = None
+_explain_lock = threading.Lock()
+# {hash de la sentencia: último EXPLAIN}, en orden de antigüedad
+_last_explained: "OrderedDict[str, float]" = OrderedDict()
+
+
+def _explain_worker(engine) -> None:
+    while True:
+        record = _explain_queue.get()
+        try:
+            with engine.connect() as conn:
+                # EXPLAIN ANALYZE ejecuta la consulta: se limita el tiempo y se revierte al terminar.
+                conn.exec_driver_sql("SET LOCAL statement_timeout = 30000")
+                rows = conn.exec_driver_sql(
+                    "EXPLAIN (ANALYZE, BUFFERS) " + record.pop("_statement"), record.pop("_parameters")
+                ).all()
+                conn.rollback()
+            record["plan"] = _redact_plan("\n".join(row[0] for row in rows))
+        except Exception as e:  # El EXPLAIN nunca debe afectar a la aplicación
+            record["plan_error"] = str(e)
+        record.pop("_statement", None)
+        record.pop("_parameters", None)
+        _file_logger().info(json.dumps(record, ensure_ascii=False))
+
+
+def _should_explain(statement: str, parameters: Any) -> bool:
+    # Solo SELECT: EXPLAIN ANALYZE de un INSERT/UPDATE aplicaría la escritura otra vez.
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return False
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        return False
+    if random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE:
+        return False
+
+    key = hashlib.sha1(statement.encode()).hexdigest()
+    now = time.monotonic()
+    with _explain_lock:
+        # Se descartan las sentencias que ya cumplieron su espera (y las más viejas si hay demasiadas):
+        # las IN-lists de largo variable generan textos distintos y el registro no debe crecer sin límite
+        while _last_explained and (
+            now - next(iter(_last_explained.values())) >= SLOW_QUERY_EXPLAIN_COOLDOWN
+            or len(_last_explained) >= SLOW_QUERY_EXPLAIN_TRACKED
+        ):
+            _last_explained.popitem(last=False)
+        if key in _last_explained:
+            return False
+        _last_explained[key] = now
+    return True
+
+
+def _schedule_explain(engine, record: dict, statement: str, parameters: Any) -> bool:
+    global _explain_thread
+    with _explain_lock:
+        if _explain_thread is None:
+            _explain_thread = threading.Thread(target=_explain_worker, args=(engine,), name="slow-query-explain", daemon=True)
+            _explain_thread.start()
+    try:
+        _explain_queue.put_nowait(dict(record, _statement=statement, _parameters=parameters))
+        return True
+    except queue.Full:
+        return False
+
+
+# --- Listeners de SQLAlchemy ---
+
+def install_slow_query_log(engine) -> None:
+    """
+    Registra en `engine` los listeners que miden cada sentencia y anotan las lentas.
+    """
+    if SLOW_QUERY_THRESHOLD_MS <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        if elapsed_ms < SLOW_QUERY_THRESHOLD_MS or statement.startswith("EXPLAIN"):
+            return
+
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed_ms, 2),
+            "route": _current_route(),
+            "statement": statement,
+            "parameters": _redact(parameters),
+        }
+        # Con muestra, el registro se escribe junto con su plan cuando termina el EXPLAIN.
+        if _should_explain(statement, parameters) and _schedule_explain(engine, record, statement, parameters):
+            return
+        _file_logger().info(json.dumps(record, ensure_ascii=False))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # La sentencia falló y no habrá after_cursor_execute: se descarta su marca de inicio.
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional
+
+# 1. Clave para firmar los tokens.
+#    En producción debe definirse SECRET_KEY para que todos los workers compartan la misma clave
+#    (el lanzador de producción, gunicorn.conf.py, no arranca sin ella); en desarrollo se genera
+#    una aleatoria y los tokens solo valen en este proceso hasta que se reinicie.
+SECRET_KEY = os.environ.get("SECRET_KEY")
+if not SECRET_KEY:
+    SECRET_KEY = secrets.token_urlsafe(32)
+    logging.getLogger("autoerp.tokens").warning(
+        "SECRET_KEY no está definida: se usa una clave aleatoria. Los tokens no valdrán en otros "
+        "workers ni después de reiniciar; defínela en producción."
+    )
+
+# Vigencia del token de acceso (por defecto, una jornada de trabajo)
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "480"))
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+# 2. Función para emitir un token de acceso
+def create_access_token(user_id: int, permission_version: int) -> str:
+    """
+    Crea un token firmado (HMAC-SHA256) con el ID del usuario y la versión de sus permisos.
+    """
+    claims = {
+        "sub": user_id,
+        "pv": permission_version,
+        "exp": int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+# 3. Función para verificar un token de acceso
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verifica la firma y la expiración del token.
+    Devuelve los claims si es válido, None si no lo es.
+    """
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        return None
+
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import select
+from sqlalchemy import exists, select
 from typing import List
 from.schemas.user import UserCreate
 from . import hashing  # Asegúrate de tener un módulo de hashing para las contr
 
 # Importar las clases de Pydantic desde su nuevo archivo
-from .schemas.user import UserResponse, UserUpdate, PermissionBase
+from .schemas.user import UserResponse, UserUpdate, PermissionBase, PermissionResponse
 
 # Reutilizamos la dependencia get_db y los modelos
 from .database import User, Permission, get_db
+from .entity_cache import invalidate_entities
+from .permissions import set_user_permissions, set_all_user_permissions
+from .inserts import insert_returning, integrity_errors
 
 
 # --- Creación del Router ---
@@ -21,11 +24,8 @@ async def create_user(
     user_data: UserCreate,
     db: Session = Depends(get_db),
 ):
-    # 1. Verificar si el usuario ya existe
-    existing_user = db.scalars(
-        select(User).where(User.username == user_data.username)
-    ).first()
-    if existing_user:
+    # 1. Verificar si el usuario ya existe antes de pagar el costo de bcrypt
+    if db.scalar(select(exists().where(User.username == user_data.username))):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="El nombre de usuario ya está en uso"
@@ -34,45 +34,40 @@ async def create_user(
     # 2. Hashear la contraseña (¡MUY IMPORTANTE!)
     hashed_password = hashing.hash_password(user_data.password)
 
-    # 3. Preparar los datos del nuevo usuario
-    new_user = User(
-        username=user_data.username,
-        password=hashed_password, # Guarda la contraseña hasheada
-        is_admin=user_data.is_admin,
-        is_employee=user_data.is_employee,
-        is_active=user_data.is_active
-    )
+    # La restricción única del username cubre la carrera con otra alta simultánea
+    with integrity_errors(db, conflict_detail="El nombre de usuario ya está en uso"):
+        # 3. Insertar con RETURNING para obtener su ID
+        new_user = insert_returning(db, User, dict(
+            username=user_data.username,
+            password=hashed_password, # Guarda la contraseña hasheada
+            is_admin=user_data.is_admin,
+            is_employee=user_data.is_employee,
+            is_active=user_data.is_active
+        ))
+
+        # --- LÓGICA DE PERMISOS ---
+        # Las funciones devuelven los nombres asignados: la respuesta se arma sin volver a leer los permisos
+        permission_names = []
+        if user_data.is_admin:
+            # Si es admin, ignora los permisos enviados y asigna TODOS
+            permission_names = set_all_user_permissions(db, new_user.user_id, replace=False)
+        elif user_data.permissions:
+            # Si no es admin, resuelve los permisos enviados en una sola consulta
+            permission_names = set_user_permissions(db, new_user.user_id, [p.name for p in user_data.permissions], replace=False)
+
+        response = UserResponse(
+            user_id=new_user.user_id,
+            username=new_user.username,
+            is_admin=new_user.is_admin,
+            is_employee=new_user.is_employee,
+            is_active=new_user.is_active,
+            permissions=[PermissionResponse(name=name) for name in permission_names],
+        )
 
-    # --- LÓGICA DE PERMISOS ---
-    if user_data.is_admin:
-        # Si es admin, ignora los permisos enviados y asigna TODOS
-        all_permissions = db.scalars(select(Permission)).all()
-        new_user.permissions = list(all_permissions)
-    elif user_data.permissions:
-        # Si no es admin, procesa los permisos enviados (como antes)
-        permission_names = [p.name for p in user_data.permissions]
-        permissions_objs = [
-            db.scalars(select(Permission).where(Permission.name == name)).first() or Permission(name=name)
-            for name in permission_names
-        ]
-        new_user.permissions = permissions_objs
+        # 4. Confirmar la transacción
+        db.commit()
 
-    
-    # 4. Manejar y asignar los permisos
-    if user_data.permissions:
-        permission_names = [p.name for p in user_data.permissions]
-        permissions_objs = [
-            db.scalars(select(Permission).where(Permission.name == name)).first() or Permission(name=name)
-            for name in permission_names
-        ]
-        new_user.permissions = permissions_objs
-
-    # 5. Guardar el nuevo usuario en la base de datos
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    return new_user
+    return response
 
 
 @router.get("/", response_model=List[UserResponse])
@@ -138,17 +133,16 @@ async def update_user(
     # --- LÓGICA DE PERMISOS ---
     if user.is_admin:
         # Si el usuario AHORA es admin (después de la actualización), asigna todos los permisos
-        all_permissions = db.scalars(select(Permission)).all()
-        user.permissions = list(all_permissions)
+        set_all_user_permissions(db, user_id)
     elif permissions_to_update is not None:
         # Si NO es admin y se enviaron permisos, procesa los permisos enviados
-        permission_names = [p['name'] for p in permissions_to_update]
-        permissions_objs = [
-            db.scalars(select(Permission).where(Permission.name == name)).first() or Permission(name=name)
-            for name in permission_names
-        ]
-        user.permissions = permissions_objs
-        
+        set_user_permissions(db, user_id, [p['name'] for p in permissions_to_update])
+
+    # Un cambio de permisos (o la desactivación) invalida los tokens emitidos con la versión anterior
+    if permissions_to_update is not None or "is_admin" in update_data or "is_active" in update_data:
+        user.permission_version = (user.permission_version or 0) + 1
+    # y los permisos en caché de todos los workers
+    invalidate_entities(db, "permissions", user_id)
     db.commit()
     db.refresh(user)
 
@@ -171,5 +165,6 @@ async def delete_user_by_id(
         )
 
     db.delete(user)
+    invalidate_entities(db, "permissions", user_id)
     db.commit()
     return
\ No newline at end of file
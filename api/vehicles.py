@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 from .database import get_db, Vehicle, Color, Motor, VehicleType, Make, Model, Transmission
 from .schemas.user import VehicleResponse, VehicleCreate, ColorResponse, ColorCreate, MotorResponse, MotorCreate, VehicleTypeResponse, VehicleTypeCreate, VehicleMakesResponse, VehicleModelsResponse, VehicleTransmissionsResponse
 from fastapi import status
 from fastapi.exceptions import HTTPException
+from .fields import sparse_fields, sparse_response
+from .entity_cache import invalidate_entities
+from .response_cache import catalog_response
+from .inserts import insert_returning, integrity_errors
 
 
 router = APIRouter()
@@ -13,11 +17,16 @@ router = APIRouter()
 @router.get("/{customer_id}", response_model=List[VehicleResponse])
 async def get_vehicles_by_id(
     customer_id: int,  # FastAPI espera un entero del parámetro de ruta
+    columns: Optional[List] = Depends(sparse_fields(VehicleResponse, Vehicle)),
     db: Session = Depends(get_db),
 ):
     """
     Obtiene una lista de todos los vehículos de un cliente específico.
+    Con `?fields=` solo se consultan las columnas pedidas, sin cargar las relaciones.
     """
+    if columns:
+        return sparse_response(db.execute(select(*columns).filter(Vehicle.customer_id == customer_id)).all())
+
     stmt = (
         select(Vehicle)
         .filter(Vehicle.customer_id == customer_id)
@@ -35,20 +44,32 @@ async def create_vehicle(
     """
     Crea un nuevo vehículo en la base de datos.
     """
-    new_vehicle = Vehicle(**vehicle_data.model_dump())
-    db.add(new_vehicle)
-    db.commit()
-    db.refresh(new_vehicle)
-    return new_vehicle
+    # Las restricciones únicas (VIN, placa) y las claves foráneas validan en el mismo INSERT
+    with integrity_errors(db, conflict_detail="A vehicle with this VIN or plate already exists"):
+        new_vehicle = insert_returning(db, Vehicle, vehicle_data.model_dump())
+        # Se serializa antes del commit, que expira la instancia y obligaría a releerla
+        response = VehicleCreate.model_validate(new_vehicle, from_attributes=True)
+        db.commit()
+    return response
 
 @router.get("/{vehicle_id}", response_model=VehicleResponse)
 async def get_vehicle_by_id(
     vehicle_id: int,
+    columns: Optional[List] = Depends(sparse_fields(VehicleResponse, Vehicle)),
     db: Session = Depends(get_db),
 ):
     """
     Obtiene un solo vehículo por su ID.
     """
+    if columns:
+        row = db.execute(select(*columns).where(Vehicle.vehicle_id == vehicle_id)).first()
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vehicle not found"
+            )
+        return sparse_response(row)
+
     vehicle = db.get(Vehicle, vehicle_id)
 
     if not vehicle:
@@ -85,23 +106,23 @@ async def create_color(
     """
     Crea un nuevo color en la base de datos.
     """
-    new_color = Color(**color_data.model_dump())
-    db.add(new_color)
-    db.commit()
-    db.refresh(new_color)
-    return new_color
+    with integrity_errors(db, conflict_detail="Color already exists"):
+        new_color = insert_returning(db, Color, color_data.model_dump())
+        response = ColorCreate.model_validate(new_color, from_attributes=True)
+        invalidate_entities(db, "catalogs", "colors")
+        db.commit()
+    return response
 
 
 @router.get("/colors/", response_model=List[ColorResponse])
 async def get_all_colors(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene una lista de todas las órdenes.
     """
     stmt = select(Color)
-    colors = db.scalars(stmt).unique().all()
-    return colors
+    return await catalog_response(request, "colors", List[ColorResponse], lambda session: session.scalars(stmt).unique().all())
 
 @router.get("/motors/{motor_id}", response_model=MotorResponse)
 async def get_motor_by_id(
@@ -123,14 +144,13 @@ async def get_motor_by_id(
 
 @router.get("/motors/", response_model=List[MotorResponse])
 async def get_all_motors(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene una lista de todos los motores.
     """
     stmt = select(Motor)
-    motors = db.scalars(stmt).unique().all()
-    return motors
+    return await catalog_response(request, "motors", List[MotorResponse], lambda session: session.scalars(stmt).unique().all())
 
 @router.get("/types/{v_type_id}", response_model=VehicleTypeResponse)
 async def get_vehicle_type_by_id(
@@ -152,45 +172,42 @@ async def get_vehicle_type_by_id(
 
 @router.get("/types/", response_model=List[VehicleTypeResponse])
 async def get_all_vehicle_types(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene una lista de todos los tipos de vehículos.
     """
     stmt = select(VehicleType)
-    vehicle_types = db.scalars(stmt).unique().all()
-    return vehicle_types
+    return await catalog_response(request, "vehicle-types", List[VehicleTypeResponse], lambda session: session.scalars(stmt).unique().all())
 
 @router.get("/makes/", response_model=List[VehicleMakesResponse])
 async def get_all_makes(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene una lista de todas las marcas de vehículos.
     """
     stmt = select(Make)
-    makes = db.scalars(stmt).unique().all()
-    return makes
+    return await catalog_response(request, "makes", List[VehicleMakesResponse], lambda session: session.scalars(stmt).unique().all())
 
 @router.get("/models/{make_id}", response_model=List[VehicleModelsResponse])
 async def get_models_by_make_id(
     make_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene una lista de todos los modelos de una marca específica.
     """
     stmt = select(Model).filter(Model.make_id == make_id)
-    models = db.scalars(stmt).unique().all()
-    return models
+    return await catalog_response(request, "models", List[VehicleModelsResponse],
+                            lambda session: session.scalars(stmt).unique().all(), key=str(make_id))
 
 @router.get("/transmissions/", response_model=List[VehicleTransmissionsResponse])
 async def get_all_transmissions(
-    db: Session = Depends(get_db),
+    request: Request,
 ):
     """
     Obtiene una lista de todos los tipos de transmisión.
     """
     stmt = select(Transmission)
-    transmissions = db.scalars(stmt).unique().all()
-    return transmissions
\ No newline at end of file
+    return await catalog_response(request, "transmissions", List[VehicleTransmissionsResponse], lambda session: session.scalars(stmt).unique().all())
\ No newline at end of file
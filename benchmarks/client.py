@@ -0,0 +1,129 @@
+import http.client
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """
+    Percentil por rango más cercano sobre una lista ya ordenada.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """
+    Acumula latencias por ruta ("MÉTODO /plantilla/{param}") de forma segura entre hilos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._bytes = defaultdict(int)
+
+    def record(self, route: str, seconds: float, status: int, size: int) -> None:
+        with self._lock:
+            self._samples[route].append(seconds)
+            self._bytes[route] += size
+            if status == 0 or status >= 400:
+                self._errors[route] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """
+        Devuelve throughput y p50/p95/p99 (en ms) por ruta y en total.
+        """
+        with self._lock:
+            samples = {route: sorted(values) for route, values in self._samples.items()}
+            errors = dict(self._errors)
+            sizes = dict(self._bytes)
+
+        def stats(values, error_count, size):
+            return {
+                "count": len(values),
+                "errors": error_count,
+                "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+                "avg_bytes": int(size / len(values)) if values else 0,
+            }
+
+        routes = {
+            route: stats(values, errors.get(route, 0), sizes.get(route, 0))
+            for route, values in sorted(samples.items())
+        }
+        all_values = sorted(v for values in samples.values() for v in values)
+        total = stats(all_values, sum(errors.values()), sum(sizes.values()))
+        return {"total": total, "routes": routes}
+
+
+class Client:
+    """
+    Cliente HTTP mínimo con conexión keep-alive (uno por hilo de carga).
+    """
+
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.recorder = recorder
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(
+        self,
+        method: str,
+        route: str,
+        body: Any = None,
+        query: Optional[Dict[str, Any]] = None,
+        **path_params: Any,
+    ) -> Tuple[int, Any]:
+        """
+        Ejecuta una petición y registra su latencia bajo `MÉTODO route` (la plantilla, no la URL final).
+        Devuelve (status, json) con status 0 si hubo un error de conexión.
+        """
+        path = self.prefix + route.format(**path_params)
+        if query:
+            path += "?" + urlencode(query)
+        payload = json.dumps(body).encode() if body is not None else None
+
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=payload, headers=self.headers)
+            response = conn.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.recorder.record(f"{method} {route}", time.perf_counter() - started, 0, 0)
+            return 0, None
+        self.recorder.record(f"{method} {route}", time.perf_counter() - started, status, len(raw))
+
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+        return status, data
@@ -0,0 +1,121 @@
+"""
+Presupuesto de tiempo de importación (arranque en frío).
+
+Importa `api.main` en intérpretes nuevos con `python -X importtime`, toma la mediana
+del tiempo acumulado y falla si supera el presupuesto. También verifica que el arranque
+no cargue módulos que deben ser perezosos (psycopg2, passlib, cProfile...) ni genere
+el esquema OpenAPI.
+
+Uso:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 900 --runs 9 --top 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Módulos que solo deben cargarse al primer uso, nunca al importar la app
+DEFAULT_FORBIDDEN = ("psycopg2", "passlib", "bcrypt", "cProfile", "pstats", "logging.handlers")
+
+# Se importa el módulo y se sale con código 3 si el esquema OpenAPI ya se generó.
+# Con `import` y no importlib.import_module: -X importtime solo registra el import del intérprete.
+PROBE = """
+import sys
+import {module} as module
+app = getattr(module, "app", None)
+sys.exit(3 if app is not None and getattr(app, "openapi_schema", None) is not None else 0)
+"""
+
+
+def run_once(module: str) -> Tuple[List[Tuple[int, int, str]], bool]:
+    """
+    Importa `module` en un intérprete nuevo. Devuelve las filas de -X importtime
+    (self_us, cumulative_us, nombre con sangría) y si se generó el esquema OpenAPI.
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if process.returncode not in (0, 3):
+        raise RuntimeError(f"Falló la importación de {module}:\n{process.stderr[-2000:]}")
+
+    rows = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows, process.returncode == 3
+
+
+def module_total_ms(rows: List[Tuple[int, int, str]], module: str) -> float:
+    # La línea del propio módulo acumula todo lo que su importación arrastró
+    for _, cumulative_us, name in rows:
+        if name.strip() == module:
+            return cumulative_us / 1000
+    raise RuntimeError(f"{module} no aparece en la salida de -X importtime")
+
+
+def by_package(rows: List[Tuple[int, int, str]], project: str) -> Dict[str, float]:
+    """
+    Tiempo propio (ms) agrupado por paquete de primer nivel; los módulos del proyecto se listan por separado.
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    for self_us, _, name in rows:
+        name = name.strip()
+        key = name if name.split(".")[0] == project else name.split(".")[0]
+        totals[key] += self_us / 1000
+    return totals
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de importación de AutoERP API")
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--runs", type=int, default=5, help="Importaciones medidas (se reporta la mediana)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--top", type=int, default=15, help="Paquetes más costosos a mostrar")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="Módulos que no deben importarse al arrancar (separados por comas)")
+    args = parser.parse_args(argv)
+
+    # Una importación de calentamiento para que el bytecode (.pyc) ya exista
+    run_once(args.module)
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    totals = [module_total_ms(rows, args.module) for rows, _ in runs]
+    median = statistics.median(totals)
+    rows, openapi_built = runs[totals.index(sorted(totals)[len(totals) // 2])]
+
+    print(f"{args.module}: mediana {median:.1f} ms (min {min(totals):.1f}, max {max(totals):.1f}, "
+          f"{args.runs} corridas), presupuesto {args.budget_ms:.0f} ms\n")
+    print(f"{'Paquete':<40}{'ms propios':>12}")
+    packages = sorted(by_package(rows, args.module.split(".")[0]).items(), key=lambda item: -item[1])
+    for name, ms in packages[:args.top]:
+        print(f"{name:<40}{ms:>12.1f}")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"la importación tarda {median:.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    imported = {name.strip() for _, _, name in rows}
+    for forbidden in filter(None, (name.strip() for name in args.forbid.split(","))):
+        if forbidden in imported:
+            failures.append(f"{forbidden} se importa al arrancar")
+    if openapi_built:
+        failures.append("el esquema OpenAPI se genera al importar")
+
+    if failures:
+        print("\nFALLA: " + "; ".join(failures))
+        return 1
+    print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
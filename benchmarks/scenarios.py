@@ -0,0 +1,110 @@
+import itertools
+import random
+from datetime import datetime, timezone
+
+from .client import Client
+from .seed import SeedContext
+
+VIEWS = ["front", "back", "left", "right", "up"]
+BOARD_FIELDS = "order_id,c_order_id,op_status_id,service_bay,priority_id,mechanic_id"
+
+_order_counter = itertools.count()
+
+
+def order_intake(client: Client, ctx: SeedContext, rng: random.Random) -> None:
+    """
+    Recepción de un vehículo: crea la orden, carga el checklist de inventario,
+    guarda sus respuestas y los detalles de carrocería, y actualiza el estatus.
+    """
+    status, order = client.request("POST", "/orders/", body={
+        "c_order_id": f"B{rng.getrandbits(32):08x}-{next(_order_counter)}",
+        "order_date": datetime.now(timezone.utc).isoformat(),
+        "customer_id": rng.choice(ctx.customer_ids) if ctx.customer_ids else None,
+        "op_status_id": ctx.op_status_ids[0],
+        "adm_status_id": ctx.adm_status_ids[0],
+        "priority_id": rng.choice(ctx.priority_ids),
+        "fuel_level": rng.randint(1, 8),
+    })
+    if status != 201:
+        return
+    order_id = order["order_id"]
+
+    client.request("GET", "/orders/inventory-types/")
+    entries = []
+    for inv_type_id in ctx.inventory_type_ids:
+        client.request("GET", "/orders/inventory-items/{inv_type_id}", inv_type_id=inv_type_id)
+        entries.extend(
+            {"order_id": order_id, "item_id": item_id, "data": {"value": rng.choice(["ok", "ok", "ok", "damaged", "missing"])}}
+            for item_id in ctx.inventory_item_ids.get(inv_type_id, [])
+        )
+    if entries:
+        client.request("POST", "/orders/inventory-data/", body=entries)
+
+    client.request("GET", "/orders/bodywork-detail-types/")
+    details = [
+        {
+            "order_id": order_id,
+            "view": rng.choice(VIEWS),
+            "detail_type_id": rng.choice(ctx.detail_type_ids),
+            "coordinates": {"x": round(rng.random(), 4), "y": round(rng.random(), 4)},
+        }
+        for _ in range(rng.randint(0, 4))
+    ]
+    if details:
+        client.request("POST", "/orders/bodywork-details/", body=details)
+
+    client.request("PATCH", "/orders/{order_id}", body={
+        "op_status_id": rng.choice(ctx.op_status_ids),
+        "service_bay": f"B{rng.randint(1, 12)}",
+    }, order_id=order_id)
+
+
+def board_polling(client: Client, ctx: SeedContext, rng: random.Random) -> None:
+    """
+    Pantalla del taller: refresca el tablero y abre una orden.
+    """
+    client.request("GET", "/orders/", query={"fields": BOARD_FIELDS})
+    if ctx.order_ids:
+        client.request("GET", "/orders/{order_id}", order_id=rng.choice(ctx.order_ids))
+
+
+def customer_typeahead(client: Client, ctx: SeedContext, rng: random.Random) -> None:
+    """
+    Búsqueda de cliente mientras se escribe el nombre (una petición por tecla a partir de 3 letras).
+    """
+    if not ctx.customer_names:
+        return
+    name = rng.choice(ctx.customer_names)
+    for length in range(3, min(len(name), 10) + 1):
+        client.request("GET", "/customers/search", query={"full_name": name[:length]})
+
+
+def vehicle_form(client: Client, ctx: SeedContext, rng: random.Random) -> None:
+    """
+    Alta de vehículo: carga todos los catálogos del formulario.
+    """
+    client.request("GET", "/vehicles/colors/")
+    client.request("GET", "/vehicles/motors/")
+    client.request("GET", "/vehicles/types/")
+    client.request("GET", "/vehicles/transmissions/")
+    client.request("GET", "/vehicles/makes/")
+    if ctx.make_ids:
+        client.request("GET", "/vehicles/models/{make_id}", make_id=rng.choice(ctx.make_ids))
+    client.request("GET", "/orders/extra-items/")
+
+
+def login(client: Client, ctx: SeedContext, rng: random.Random) -> None:
+    """
+    Inicio de sesión (incluye la verificación bcrypt).
+    """
+    client.request("POST", "/auth/login", body={"username": ctx.username, "password": ctx.password})
+
+
+# Escenario -> (función, peso relativo en la mezcla)
+SCENARIOS = {
+    "order_intake": (order_intake, 1),
+    "board_polling": (board_polling, 10),
+    "customer_typeahead": (customer_typeahead, 3),
+    "vehicle_form": (vehicle_form, 2),
+    "login": (login, 1),
+}
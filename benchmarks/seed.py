@@ -0,0 +1,169 @@
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from api import hashing
+from api.database import (
+    AdmStatus, AppointmentReason, AppointmentStatus, BodyworkDetailTypes, Color, Customer, InventoryItems,
+    InventoryTypes, Make, Model, Motor, OpStatus, Order, OrderExtraItems, Permission, Position, Priority,
+    SessionLocal, Transmission, User, VehicleType,
+)
+
+BENCH_USERNAME = "bench-user"
+BENCH_PASSWORD = "bench-password"
+
+FIRST_NAMES = [
+    "Angel", "María", "José", "Guadalupe", "Juan", "Fernanda", "Luis", "Sofía", "Carlos", "Valeria",
+    "Jorge", "Camila", "Miguel", "Daniela", "Ricardo", "Ximena", "Alejandro", "Regina", "Eduardo", "Paola",
+]
+LAST_NAMES = [
+    "Gongora", "Hernández", "García", "Martínez", "López", "González", "Pérez", "Rodríguez", "Sánchez",
+    "Ramírez", "Cruz", "Flores", "Gómez", "Morales", "Vázquez", "Reyes", "Jiménez", "Torres", "Díaz", "Ruiz",
+]
+COMPANY_WORDS = ["Transportes", "Logística", "Servicios", "Grupo", "Flotillas", "Distribuidora", "Comercial"]
+
+
+@dataclass
+class SeedContext:
+    """
+    IDs ya existentes en la base de datos que usan los escenarios de carga.
+    """
+    customer_ids: List[int] = field(default_factory=list)
+    customer_names: List[str] = field(default_factory=list)
+    order_ids: List[int] = field(default_factory=list)
+    op_status_ids: List[int] = field(default_factory=list)
+    adm_status_ids: List[int] = field(default_factory=list)
+    priority_ids: List[int] = field(default_factory=list)
+    make_ids: List[int] = field(default_factory=list)
+    inventory_type_ids: List[int] = field(default_factory=list)
+    inventory_item_ids: Dict[int, List[int]] = field(default_factory=dict)
+    detail_type_ids: List[int] = field(default_factory=list)
+    username: str = BENCH_USERNAME
+    password: str = BENCH_PASSWORD
+
+
+def _ensure_catalog(db, model, column, values) -> None:
+    """
+    Inserta los valores de catálogo que falten (idempotente).
+    """
+    db.execute(pg_insert(model).values([{column: value} for value in values]).on_conflict_do_nothing())
+
+
+def seed_catalogs(db) -> None:
+    """
+    Inserta los catálogos (estatus, colores, marcas, checklist de inventario, etc.) que falten.
+    """
+    # 1. Catálogos con restricción UNIQUE
+    _ensure_catalog(db, OpStatus, "status", ["Recibida", "Diagnóstico", "En reparación", "Lista", "Entregada"])
+    _ensure_catalog(db, AdmStatus, "status", ["Pendiente", "Autorizada", "Facturada"])
+    _ensure_catalog(db, Priority, "level", ["Normal", "Alta", "Urgente"])
+    _ensure_catalog(db, Color, "color", ["Blanco", "Negro", "Gris", "Rojo", "Azul", "Plata"])
+    _ensure_catalog(db, VehicleType, "type", ["Sedán", "SUV", "Pickup", "Hatchback", "Van"])
+    _ensure_catalog(db, Transmission, "type", ["Manual", "Automática", "CVT"])
+    _ensure_catalog(db, Make, "make", ["Nissan", "Volkswagen", "Chevrolet", "Toyota", "Honda", "Ford"])
+    _ensure_catalog(db, BodyworkDetailTypes, "type", ["Rayón", "Golpe", "Abolladura", "Pintura", "Cristal roto"])
+    _ensure_catalog(db, Position, "title", ["Asesor de servicio", "Mecánico", "Jefe de taller", "Recepción"])
+    _ensure_catalog(db, AppointmentStatus, "status", ["Programada", "Confirmada", "Completada", "Cancelada", "No asistió"])
+    _ensure_catalog(db, AppointmentReason, "reason", ["Mantenimiento", "Reparación", "Diagnóstico", "Garantía", "Hojalatería"])
+    _ensure_catalog(db, Permission, "name", ["orders", "customers", "vehicles", "appointments", "inventory", "users"])
+
+    # 2. Catálogos sin restricción UNIQUE: solo se insertan si la tabla está vacía
+    if not db.scalar(select(func.count()).select_from(Motor)):
+        db.execute(insert(Motor), [{"type": t} for t in ["Gasolina", "Diésel", "Híbrido", "Eléctrico"]])
+    if not db.scalar(select(func.count()).select_from(Model)):
+        make_ids = db.scalars(select(Make.make_id)).all()
+        db.execute(insert(Model), [
+            {"make_id": make_id, "model": f"Modelo {n}"} for make_id in make_ids for n in range(1, 9)
+        ])
+    if not db.scalar(select(func.count()).select_from(OrderExtraItems)):
+        db.execute(insert(OrderExtraItems), [
+            {"title": title} for title in ["Objetos de valor", "Refacciones del cliente", "Observaciones", "Llave adicional"]
+        ])
+    if not db.scalar(select(func.count()).select_from(InventoryTypes)):
+        for position, name in enumerate(["Exterior", "Interior", "Motor", "Accesorios", "Documentos"]):
+            inv_type = InventoryTypes(name=name, component_key="generic_checklist", position=position)
+            inv_type.items = [
+                InventoryItems(label=f"{name} {n}", input_type="select", position=n, picture_upload=(n == 0))
+                for n in range(10)
+            ]
+            db.add(inv_type)
+    db.flush()
+
+
+def seed(customers: int = 2000, orders: int = 5000, seed_value: int = 42) -> SeedContext:
+    """
+    Siembra datos mínimos para los escenarios si aún no existen y devuelve sus IDs.
+    Es idempotente: si ya hay suficientes clientes u órdenes no vuelve a insertarlos.
+    """
+    rng = random.Random(seed_value)
+    db = SessionLocal()
+    try:
+        # 1. Catálogos
+        seed_catalogs(db)
+
+        # 2. Usuario para el escenario de login
+        if not db.scalar(select(User).where(User.username == BENCH_USERNAME)):
+            db.add(User(username=BENCH_USERNAME, password=hashing.hash_password(BENCH_PASSWORD)))
+        db.flush()
+
+        # 3. Clientes
+        missing_customers = customers - db.scalar(select(func.count()).select_from(Customer))
+        if missing_customers > 0:
+            rows = []
+            for n in range(missing_customers):
+                is_company = rng.random() < 0.2
+                rows.append({
+                    "is_company": is_company,
+                    "cname": f"{rng.choice(COMPANY_WORDS)} {rng.choice(LAST_NAMES)}" if is_company else None,
+                    "fname": rng.choice(FIRST_NAMES),
+                    "lname": rng.choice(LAST_NAMES),
+                    "email": f"bench{n}-{rng.getrandbits(32):x}@example.com",
+                    "phone": f"55{rng.randint(10000000, 99999999)}",
+                })
+            db.execute(insert(Customer), rows)
+
+        # 4. Órdenes históricas
+        customer_ids = db.scalars(select(Customer.customer_id)).all()
+        op_status_ids = db.scalars(select(OpStatus.op_status_id)).all()
+        missing_orders = orders - db.scalar(select(func.count()).select_from(Order))
+        if missing_orders > 0:
+            now = datetime.now(timezone.utc)
+            prefix = f"S{rng.getrandbits(24):06x}"
+            db.execute(insert(Order), [
+                {
+                    "c_order_id": f"{prefix}-{n}",
+                    "order_date": now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+                    "customer_id": rng.choice(customer_ids),
+                    "op_status_id": rng.choice(op_status_ids),
+                    "service_bay": f"B{rng.randint(1, 12)}",
+                }
+                for n in range(missing_orders)
+            ])
+        db.commit()
+
+        # 5. Contexto con los IDs para los escenarios
+        context = SeedContext(
+            customer_ids=list(customer_ids),
+            customer_names=[
+                f"{fname} {lname}" for fname, lname in
+                db.execute(select(Customer.fname, Customer.lname).limit(500)).all() if fname and lname
+            ],
+            order_ids=list(db.scalars(select(Order.order_id).order_by(Order.order_id.desc()).limit(1000)).all()),
+            op_status_ids=list(op_status_ids),
+            adm_status_ids=list(db.scalars(select(AdmStatus.adm_status_id)).all()),
+            priority_ids=list(db.scalars(select(Priority.priority_id)).all()),
+            make_ids=list(db.scalars(select(Make.make_id)).all()),
+            inventory_type_ids=list(db.scalars(
+                select(InventoryTypes.inv_type_id).order_by(InventoryTypes.position)
+            ).all()),
+            detail_type_ids=list(db.scalars(select(BodyworkDetailTypes.detail_type_id)).all()),
+        )
+        for inv_type_id, item_id in db.execute(select(InventoryItems.inv_type_id, InventoryItems.item_id)).all():
+            context.inventory_item_ids.setdefault(inv_type_id, []).append(item_id)
+        return context
+    finally:
+        db.close()
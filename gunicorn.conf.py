@@ -0,0 +1,79 @@
+# Configuración de Gunicorn para producción (ver start.sh): varios workers de Uvicorn
+# que comparten la app ya importada por el proceso maestro.
+import gc
+import logging
+import multiprocessing
+import os
+
+from api.database import DB_MAX_OVERFLOW, DB_POOL_SIZE, current_engine
+from api.metrics import process_memory
+
+logger = logging.getLogger("gunicorn.error")
+
+# Con varios workers (y reinicios por max_requests) todos deben firmar con la misma clave:
+# una aleatoria por proceso haría fallar los tokens emitidos por cualquier otro worker
+if not os.environ.get("SECRET_KEY"):
+    raise RuntimeError("SECRET_KEY debe estar definida para el modo de producción (varios workers)")
+
+# --- Configuración (variables de entorno) ---
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "100"))  # Conexiones que PostgreSQL permite a esta instancia
+DB_RESERVED_CONNECTIONS = int(os.environ.get("DB_RESERVED_CONNECTIONS", "10"))  # Para migraciones, psql, otros servicios
+LISTEN_CONNECTIONS = 2  # Conexiones fuera del pool por worker: LISTEN de order_events y de entity_cache
+
+
+def _default_workers() -> int:
+    """
+    Un worker por núcleo, sin pasar del presupuesto de conexiones: cada worker puede abrir
+    hasta DB_POOL_SIZE + DB_MAX_OVERFLOW conexiones del pool más las de LISTEN.
+    """
+    per_worker = DB_POOL_SIZE + DB_MAX_OVERFLOW + LISTEN_CONNECTIONS
+    budget = max(DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS, per_worker) // per_worker
+    return max(1, min(multiprocessing.cpu_count(), budget))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "0")) or _default_workers()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# La app se importa una vez en el maestro y los workers la heredan con fork (copy-on-write)
+preload_app = True
+
+# Reciclaje: cada worker se reinicia tras N peticiones (con variación, para que no caigan todos juntos)
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+
+# Apagado ordenado: SIGTERM/SIGHUP dejan terminar las peticiones en curso hasta este límite
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+
+def _log_memory(label: str) -> None:
+    memory = " ".join(f"{kind}={value / 1048576:.1f}MiB" for kind, value in process_memory().items())
+    logger.info(f"{label} (pid {os.getpid()}): {memory}")
+
+
+def when_ready(server) -> None:
+    # Lo que sobrevivió a la importación queda fuera del GC: el recolector no vuelve a tocar
+    # (ni a copiar) esas páginas en los workers
+    gc.collect()
+    gc.freeze()
+    _log_memory("Maestro listo con la app precargada")
+
+
+def pre_fork(server, worker) -> None:
+    # Lo creado en el maestro desde el último fork (p. ej. al reciclar un worker) también se congela
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:
+    # Las conexiones abiertas antes del fork no se comparten entre procesos
+    engine = current_engine()
+    if engine is not None:
+        engine.dispose(close=False)
+    _log_memory("Worker iniciado")
+
+
+def worker_exit(server, worker) -> None:
+    # Al reciclarse: cuánto creció el worker desde que arrancó
+    _log_memory("Worker terminado")
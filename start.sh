@@ -2,5 +2,14 @@
 # Iniciar la base de datos (si aplica)
 # python -m your_app.database.py
 
+# Producción (WEB_MODE=production): Gunicorn con varios workers de Uvicorn, app precargada,
+# gc.freeze() antes del fork y reciclaje de workers; ver gunicorn.conf.py.
+#   Recarga ordenada sin cortar peticiones: kill -USR2 <maestro> inicia un maestro nuevo con el
+#   código actual; luego kill -WINCH y kill -QUIT al maestro viejo. (Con la app precargada,
+#   SIGHUP solo reinicia los workers con el mismo código.)
+if [ "$WEB_MODE" = "production" ]; then
+    exec gunicorn api.main:app -c gunicorn.conf.py
+fi
+
 # Iniciar el servidor Uvicorn
 uvicorn api.main:app --host 0.0.0.0 --port $PORT